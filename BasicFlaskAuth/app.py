@@ -3,6 +3,7 @@ import json
 from functools import wraps
 from jose import jwt
 from urllib.request import urlopen
+from token_cache import TokenCache
 
 
 app = Flask(__name__)
@@ -11,6 +12,8 @@ AUTH0_DOMAIN = @TODO_REPLACE_WITH_YOUR_DOMAIN
 ALGORITHMS = ['RS256']
 API_AUDIENCE = @TODO_REPLACE_WITH_YOUR_API_AUDIENCE
 
+token_cache = TokenCache(maxsize=1024)
+
 
 class AuthError(Exception):
     def __init__(self, error, status_code):
@@ -109,10 +112,13 @@ def requires_auth(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
         token = get_token_auth_header()
-        try:
-            payload = verify_decode_jwt(token)
-        except:
-            abort(401)
+        payload = token_cache.get(token)
+        if payload is None:
+            try:
+                payload = verify_decode_jwt(token)
+            except:
+                abort(401)
+            token_cache.set(token, payload)
         return f(payload, *args, **kwargs)
 
     return wrapper
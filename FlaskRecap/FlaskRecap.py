@@ -1,6 +1,8 @@
-from flask import Flask, request, jsonify, abort
+from flask import Flask, request, abort
+from fast_json import FastJSON, jsonify
 
 app = Flask(__name__)
+FastJSON(app)
 
 greetings = {
             'en': 'hello', 
@@ -0,0 +1,274 @@
+import os
+import random
+import sys
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from jwks_standin import JWKSStandIn
+
+# Loaders for the four Flask apps of this repository.
+#
+# Each loader points the app at its own database through DATABASE_URL,
+# imports it, seeds synthetic data at the requested scale (unless
+# populate=False, e.g. when another process serves that database) and
+# returns a BenchApp: the Flask app plus the weighted request mix
+# (scenarios) used by both the pytest benchmarks and the load driver.
+#
+# The apps are plain scripts importing their siblings (`models`, `config`,
+# `forms`), so each one is imported with its own directory on sys.path and
+# DATABASE_URL has to be set before that import. Several of them ship
+# modules under the same top-level name (`fast_json`, `db_pool`,
+# `instrumentation`), so the directories of the other apps are taken off
+# sys.path and their modules out of sys.modules first.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FYYUR_DIR = os.path.join(ROOT, 'projects', '01_fyyur', 'starter_code')
+TRIVIA_DIR = os.path.join(ROOT, 'projects', '02_trivia_api', 'starter', 'backend')
+COFFEE_DIR = os.path.join(ROOT, 'projects', '03_coffee_shop_full_stack',
+                          'starter_code', 'backend')
+RECAP_DIR = os.path.join(ROOT, 'FlaskRecap')
+APP_DIRS = (FYYUR_DIR, TRIVIA_DIR, COFFEE_DIR, RECAP_DIR)
+
+DEFAULT_SCALE = 1000
+CATEGORIES = ['Science', 'Art', 'Geography', 'History', 'Entertainment', 'Sports']
+WORDS = ['river', 'mountain', 'painter', 'planet', 'novel', 'king', 'goal',
+         'movie', 'ocean', 'element', 'capital', 'symphony', 'autobiography',
+         'volcano', 'league', 'empire']
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'),
+          ('Seattle', 'WA'), ('Chicago', 'IL'), ('Boston', 'MA')]
+GENRES = ['Jazz', 'Rock n Roll', 'Folk', 'Classical', 'Blues', 'Hip-Hop']
+COLORS = ['blue', 'brown', 'white', 'green']
+
+# a request as built by a scenario: `json` or `form` is the body, if any
+Request = namedtuple('Request', 'method path json form headers')
+Request.__new__.__defaults__ = (None, None, None)
+
+# `build(rng)` returns the next Request; `weight` is its share of the mix
+Scenario = namedtuple('Scenario', 'name weight build')
+
+BenchApp = namedtuple('BenchApp', 'name app scenarios')
+
+
+class Unavailable(Exception):
+    """The app cannot be benchmarked in this environment."""
+
+
+def _import_from(directory, module):
+    others = [d for d in APP_DIRS if d != directory]
+    for name, loaded in list(sys.modules.items()):
+        path = getattr(loaded, '__file__', None) or ''
+        if any(path.startswith(d + os.sep) for d in others):
+            # apps loaded before keep the module objects they imported
+            del sys.modules[name]
+    sys.path[:] = [path for path in sys.path if path not in others]
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    __import__(module)
+    return sys.modules[module]
+
+
+def _sentence(rng, words=6):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _fixed(method, path, **kwargs):
+    request = Request(method, path, **kwargs)
+    return lambda rng: request
+
+
+# ------------------------------------------------------------------------
+# Trivia
+# ------------------------------------------------------------------------
+
+def load_trivia(database_url, workdir, scale=DEFAULT_SCALE, seed=0, populate=True):
+    os.environ['DATABASE_URL'] = database_url
+    models = _import_from(TRIVIA_DIR, 'models')
+    flaskr = _import_from(TRIVIA_DIR, 'flaskr')
+    app = flaskr.create_app({'QUIZ_RANDOM_SEED': seed})
+    if populate:
+        with app.app_context():
+            _populate_trivia(models, scale, random.Random(seed))
+            # the one-off setup step of the README
+            models.create_search_index()
+        app.category_cache.invalidate()
+
+    pages = max(scale // flaskr.QUESTIONS_PER_PAGE, 1)
+    return BenchApp('trivia', app, [
+        Scenario('categories', 2, _fixed('GET', '/categories')),
+        Scenario('questions_page', 4, lambda rng: Request(
+            'GET', '/questions?page={}'.format(rng.randint(1, pages)))),
+        Scenario('category_questions', 2, lambda rng: Request(
+            'GET', '/categories/{}/questions'.format(rng.randint(1, len(CATEGORIES))))),
+        Scenario('search', 2, lambda rng: Request(
+            'POST', '/search', json={'searchTerm': rng.choice(WORDS)[:4]})),
+        Scenario('quiz', 2, lambda rng: Request('POST', '/quizzes', json={
+            'previous_questions': [rng.randint(1, scale) for _ in range(5)],
+            'quiz_category': {'type': 'click', 'id': 0}
+        })),
+    ])
+
+
+def _populate_trivia(models, scale, rng):
+    session = models.db.session
+    session.execute(models.Question.__table__.delete())
+    session.execute(models.Category.__table__.delete())
+    session.execute(models.Category.__table__.insert(), [
+        {'id': i, 'type': name} for i, name in enumerate(CATEGORIES, start=1)])
+    session.execute(models.Question.__table__.insert(), [{
+        'id': i,
+        'question': _sentence(rng) + '?',
+        'answer': _sentence(rng, 2),
+        'category': str(rng.randint(1, len(CATEGORIES))),
+        'difficulty': rng.randint(1, 5)
+    } for i in range(1, scale + 1)])
+    session.commit()
+
+
+# ------------------------------------------------------------------------
+# Coffee shop
+# ------------------------------------------------------------------------
+
+def load_coffee(database_url, workdir, scale=DEFAULT_SCALE, seed=0, populate=True):
+    os.environ['DATABASE_URL'] = database_url
+    api = _import_from(COFFEE_DIR, 'src.api')
+    models = sys.modules['src.database.models']
+    auth = sys.modules['src.auth.auth']
+
+    # the key is kept in workdir so a --serve process and the load driver
+    # sign and verify with the same key
+    standin = JWKSStandIn(auth.AUTH0_DOMAIN, auth.API_AUDIENCE,
+                          key_file=os.path.join(workdir, 'jwks-standin.pem'))
+    standin.install(auth)
+    barista = {'Authorization': 'Bearer ' + standin.token(['get:drinks-detail'])}
+
+    if populate:
+        with api.app.app_context():
+            _populate_coffee(models, scale, random.Random(seed))
+        api.drinks_cache.clear()
+
+    return BenchApp('coffee', api.app, [
+        Scenario('drinks', 4, _fixed('GET', '/drinks')),
+        Scenario('drinks_detail', 2, _fixed('GET', '/drinks-detail', headers=barista)),
+        # a fresh token each time, so the RS256 check is measured as well
+        Scenario('drinks_detail_new_token', 1, lambda rng: Request(
+            'GET', '/drinks-detail', headers={
+                'Authorization': 'Bearer ' + standin.token(
+                    ['get:drinks-detail'], subject='bench|{}'.format(rng.random()))
+            })),
+    ])
+
+
+def _populate_coffee(models, scale, rng):
+    models.db_drop_and_create_all()
+    models.db.session.execute(models.Drink.__table__.insert(), [{
+        'title': 'drink {}'.format(i),
+        'recipe': [{
+            'name': rng.choice(WORDS),
+            'color': rng.choice(COLORS),
+            'parts': rng.randint(1, 3)
+        } for _ in range(rng.randint(1, 4))]
+    } for i in range(max(scale // 10, 1))])
+    models.db.session.commit()
+
+
+# ------------------------------------------------------------------------
+# Fyyur
+# ------------------------------------------------------------------------
+
+def load_fyyur(database_url, workdir, scale=DEFAULT_SCALE, seed=0, populate=True):
+    # venues and artists use ARRAY columns, postgres only
+    if not database_url or not database_url.startswith('postgres'):
+        raise Unavailable('fyyur needs postgres, set BENCH_FYYUR_DATABASE_URL')
+    os.environ['DATABASE_URL'] = database_url
+    fyyur = _import_from(FYYUR_DIR, 'app')
+    fyyur.app.config['WTF_CSRF_ENABLED'] = False
+
+    venues = artists = max(scale // 10, 1)
+    if populate:
+        with fyyur.app.app_context():
+            _populate_fyyur(fyyur, venues, artists, scale, random.Random(seed))
+
+    return BenchApp('fyyur', fyyur.app, [
+        Scenario('venues', 3, _fixed('GET', '/venues')),
+        Scenario('venue', 3, lambda rng: Request(
+            'GET', '/venues/{}'.format(rng.randint(1, venues)))),
+        Scenario('artists', 2, _fixed('GET', '/artists')),
+        Scenario('artist', 3, lambda rng: Request(
+            'GET', '/artists/{}'.format(rng.randint(1, artists)))),
+        Scenario('shows', 2, _fixed('GET', '/shows')),
+        Scenario('search_venues', 2, lambda rng: Request(
+            'POST', '/venues/search', form={'search_term': rng.choice(WORDS)[:4]})),
+    ])
+
+
+def _populate_fyyur(fyyur, venues, artists, shows, rng):
+    db = fyyur.db
+    db.drop_all()
+    db.create_all()
+    for table, count in ((fyyur.Venue.__table__, venues),
+                         (fyyur.Artist.__table__, artists)):
+        rows = []
+        for i in range(1, count + 1):
+            city, state = rng.choice(CITIES)
+            row = {
+                'id': i,
+                'name': '{} {}'.format(_sentence(rng, 2), i),
+                'city': city,
+                'state': state,
+                'phone': '555-555-5555',
+                'genres': rng.sample(GENRES, 2)
+            }
+            if table.name == 'venue':
+                row['address'] = '{} Main St'.format(i)
+            rows.append(row)
+        db.session.execute(table.insert(), rows)
+    now = datetime.now(timezone.utc)
+    db.session.execute(fyyur.Show.__table__.insert(), [{
+        'id': i,
+        'venue_id': rng.randint(1, venues),
+        'artist_id': rng.randint(1, artists),
+        'start_time': now + timedelta(days=rng.randint(-365, 365))
+    } for i in range(1, shows + 1)])
+    for table in ('venue', 'artist', 'show'):
+        db.session.execute(
+            "SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+            "(SELECT max(id) FROM \"{0}\"))".format(table))
+    db.session.commit()
+
+
+# ------------------------------------------------------------------------
+# FlaskRecap
+# ------------------------------------------------------------------------
+
+def load_recap(database_url, workdir, scale=DEFAULT_SCALE, seed=0, populate=True):
+    # in-memory greetings, nothing to seed
+    recap = _import_from(RECAP_DIR, 'FlaskRecap')
+    languages = sorted(recap.greetings)
+    return BenchApp('recap', recap.app, [
+        Scenario('greetings', 1, _fixed('GET', '/greeting')),
+        Scenario('greeting', 3, lambda rng: Request(
+            'GET', '/greeting/{}'.format(rng.choice(languages)))),
+    ])
+
+
+LOADERS = {
+    'fyyur': load_fyyur,
+    'trivia': load_trivia,
+    'coffee': load_coffee,
+    'recap': load_recap,
+}
+
+
+def database_url(name, workdir):
+    # BENCH_<APP>_DATABASE_URL, else a sqlite file in workdir (not for fyyur)
+    url = os.environ.get('BENCH_{}_DATABASE_URL'.format(name.upper()))
+    if url or name == 'fyyur':
+        return url
+    return 'sqlite:///' + os.path.join(workdir, name + '.db')
+
+
+def load(name, workdir, scale=None, seed=0, populate=True):
+    if scale is None:
+        scale = int(os.environ.get('BENCH_SCALE', DEFAULT_SCALE))
+    return LOADERS[name](database_url(name, workdir), workdir,
+                         scale=scale, seed=seed, populate=populate)
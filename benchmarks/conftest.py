@@ -0,0 +1,73 @@
+import os
+import random
+import time
+
+import pytest
+
+import apps
+from load import summarize
+
+# Apps are seeded once per session, in BENCH_WORKDIR or a temporary
+# directory. Without pytest-benchmark a minimal `benchmark` fixture times
+# BENCH_ROUNDS calls and the results are listed at the end of the run.
+
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', 50))
+
+_loaded = {}
+_results = {}
+
+
+@pytest.fixture(scope='session')
+def bench_workdir(tmp_path_factory):
+    workdir = os.environ.get('BENCH_WORKDIR')
+    if workdir:
+        os.makedirs(workdir, exist_ok=True)
+        return workdir
+    return str(tmp_path_factory.mktemp('bench'))
+
+
+@pytest.fixture(scope='session')
+def load_app(bench_workdir):
+    def load(name):
+        if name not in _loaded:
+            try:
+                _loaded[name] = apps.load(name, bench_workdir)
+            except apps.Unavailable as e:
+                _loaded[name] = e
+        if isinstance(_loaded[name], apps.Unavailable):
+            pytest.skip(str(_loaded[name]))
+        return _loaded[name]
+    return load
+
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    @pytest.fixture
+    def benchmark(request):
+        def run(function, *args, **kwargs):
+            function(*args, **kwargs)
+            latencies = []
+            for _ in range(ROUNDS):
+                began = time.perf_counter()
+                result = function(*args, **kwargs)
+                latencies.append(time.perf_counter() - began)
+            _results[request.node.name] = summarize(
+                latencies, 0, sum(latencies))
+            return result
+        return run
+
+    def pytest_terminal_summary(terminalreporter):
+        if not _results:
+            return
+        terminalreporter.section('benchmarks ({} rounds)'.format(ROUNDS))
+        terminalreporter.write_line('{:<52}{:>10}{:>10}{:>10}{:>10}'.format(
+            'test', 'rps', 'p50_ms', 'p90_ms', 'p99_ms'))
+        for name, stats in sorted(_results.items()):
+            terminalreporter.write_line('{:<52}{:>10.1f}{:>10.2f}{:>10.2f}{:>10.2f}'.format(
+                name, stats['rps'], stats['p50_ms'], stats['p90_ms'], stats['p99_ms']))
+
+
+@pytest.fixture
+def rng():
+    return random.Random(0)
@@ -0,0 +1,85 @@
+import os
+import time
+
+from jose import jwk, jwt
+from jose.constants import ALGORITHMS
+
+# Local stand-in for the Auth0 tenant used by the coffee shop.
+#
+# Generates an RSA key pair once, serves its public half as a JWKS document
+# through the `fetcher` hook of auth.jwks_cache and signs RS256 tokens with
+# the issuer and audience auth.verify_decode_jwt expects, so the full
+# signature check runs without any network access.
+
+
+def _generate_private_pem(bits=2048):
+    # cryptography when installed, else python-rsa which python-jose
+    # always pulls in
+    try:
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+    except ImportError:
+        import rsa
+        _, private = rsa.newkeys(bits)
+        return private.save_pkcs1().decode('utf-8')
+    key = rsa.generate_private_key(65537, bits, default_backend())
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption()).decode('utf-8')
+
+
+def _load_private_pem(key_file):
+    # reuse the key of an earlier run so several processes can share it
+    if key_file and os.path.exists(key_file):
+        with open(key_file) as f:
+            return f.read()
+    pem = _generate_private_pem()
+    if key_file:
+        with open(key_file, 'w') as f:
+            f.write(pem)
+    return pem
+
+
+class JWKSStandIn:
+    def __init__(self, domain, audience, kid='bench-key', key_file=None):
+        self.issuer = f'https://{domain}/'
+        self.audience = audience
+        self.kid = kid
+        self.private_pem = _load_private_pem(key_file)
+        numbers = jwk.construct(
+            self.private_pem, ALGORITHMS.RS256).public_key().to_dict()
+        self.jwks = {'keys': [{
+            'kty': 'RSA',
+            'kid': kid,
+            'use': 'sig',
+            'alg': ALGORITHMS.RS256,
+            'n': numbers['n'],
+            'e': numbers['e']
+        }]}
+        self.fetches = 0
+
+    def fetch(self, url):
+        self.fetches += 1
+        return self.jwks
+
+    def install(self, auth_module):
+        # point the app's JWKS cache at this key and drop anything cached
+        auth_module.jwks_cache.fetcher = self.fetch
+        auth_module.jwks_cache.clear()
+        auth_module.token_cache.clear()
+
+    def token(self, permissions, subject='bench|user', expires_in=3600):
+        now = int(time.time())
+        claims = {
+            'iss': self.issuer,
+            'sub': subject,
+            'aud': self.audience,
+            'iat': now,
+            'exp': now + expires_in,
+            'permissions': list(permissions)
+        }
+        return jwt.encode(claims, self.private_pem, algorithm=ALGORITHMS.RS256,
+                          headers={'kid': self.kid})
+
@@ -0,0 +1,211 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import apps  # noqa: E402
+
+# Local load driver, in the spirit of locust.
+#
+# `users` threads replay the weighted scenario mix of an app for `duration`
+# seconds, either in-process through the Flask test client or against a
+# running server (--url, e.g. one started with --serve). Reports latency
+# percentiles, throughput and errors per scenario.
+#
+#   python benchmarks/load.py trivia coffee recap --users 8 --duration 10
+#   python benchmarks/load.py trivia --serve --port 5000
+#   python benchmarks/load.py trivia --url http://localhost:5000
+
+
+def percentile(values, p):
+    # nearest rank on an already sorted list
+    if not values:
+        return 0.0
+    rank = max(int(round(p / 100.0 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def summarize(latencies, errors, elapsed):
+    values = sorted(latencies)
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'rps': len(values) / elapsed if elapsed else 0.0,
+        'mean_ms': 1000 * sum(values) / len(values) if values else 0.0,
+        'p50_ms': 1000 * percentile(values, 50),
+        'p90_ms': 1000 * percentile(values, 90),
+        'p99_ms': 1000 * percentile(values, 99),
+        'max_ms': 1000 * values[-1] if values else 0.0,
+    }
+
+
+class ClientSender:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def __call__(self, request):
+        kwargs = {'method': request.method, 'headers': request.headers}
+        if request.json is not None:
+            kwargs['json'] = request.json
+        if request.form is not None:
+            kwargs['data'] = request.form
+        response = self.client.open(request.path, **kwargs)
+        response.get_data()
+        return response.status_code
+
+
+class HTTPSender:
+    # one keep-alive connection per user
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.prefix = parts.path.rstrip('/')
+        self.connection = http.client.HTTPConnection(parts.netloc, timeout=30)
+
+    def __call__(self, request):
+        headers = dict(request.headers or {})
+        body = None
+        if request.json is not None:
+            body = json.dumps(request.json)
+            headers['Content-Type'] = 'application/json'
+        elif request.form is not None:
+            body = urlencode(request.form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self.connection.request(request.method, self.prefix + request.path,
+                                    body=body, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            raise
+        return response.status
+
+
+def run(bench, users=4, duration=5.0, url=None, seed=0):
+    names = [scenario.name for scenario in bench.scenarios]
+    weights = [scenario.weight for scenario in bench.scenarios]
+    builders = {scenario.name: scenario.build for scenario in bench.scenarios}
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    start = threading.Event()
+
+    def user(index):
+        rng = random.Random(seed + index)
+        send = HTTPSender(url) if url else ClientSender(bench.app)
+        own_latencies = defaultdict(list)
+        own_errors = defaultdict(int)
+        start.wait()
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            request = builders[name](rng)
+            began = time.perf_counter()
+            try:
+                status = send(request)
+            except Exception:
+                status = None
+            own_latencies[name].append(time.perf_counter() - began)
+            if status is None or status >= 400:
+                own_errors[name] += 1
+        with lock:
+            for name, values in own_latencies.items():
+                latencies[name].extend(values)
+            for name, count in own_errors.items():
+                errors[name] += count
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    began = time.perf_counter()
+    start.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    report = {name: summarize(latencies[name], errors[name], elapsed)
+              for name in names if latencies[name]}
+    report['total'] = summarize(
+        [value for values in latencies.values() for value in values],
+        sum(errors.values()), elapsed)
+    return report
+
+
+def print_report(app_name, report, out=sys.stdout):
+    columns = ('requests', 'errors', 'rps', 'mean_ms', 'p50_ms', 'p90_ms',
+               'p99_ms', 'max_ms')
+    out.write('\n{}\n'.format(app_name))
+    out.write('{:<26}'.format('scenario') +
+              ''.join('{:>10}'.format(column) for column in columns) + '\n')
+    for name, stats in report.items():
+        out.write('{:<26}'.format(name) + ''.join(
+            '{:>10}'.format(stats[c]) if isinstance(stats[c], int)
+            else '{:>10.1f}'.format(stats[c]) for c in columns) + '\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local load driver for the FSND apps')
+    parser.add_argument('apps', nargs='*', metavar='app',
+                        help='one of {}, default all'.format(', '.join(sorted(apps.LOADERS))))
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--scale', type=int, default=None,
+                        help='rows to seed, default BENCH_SCALE or {}'.format(
+                            apps.DEFAULT_SCALE))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', default=None,
+                        help='where sqlite databases and the test key live')
+    parser.add_argument('--url', default=None,
+                        help='drive a running server instead of the test client')
+    parser.add_argument('--serve', action='store_true',
+                        help='seed and serve the app for --url runs')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--json', default=None, help='also write the report here')
+    args = parser.parse_args(argv)
+
+    unknown = set(args.apps) - set(apps.LOADERS)
+    if unknown:
+        parser.error('unknown app: {}'.format(', '.join(sorted(unknown))))
+    args.apps = args.apps or sorted(apps.LOADERS)
+
+    workdir = args.workdir or os.path.join(tempfile.gettempdir(), 'fsnd-bench')
+    os.makedirs(workdir, exist_ok=True)
+
+    if args.serve or args.url:
+        if len(args.apps) != 1:
+            parser.error('--serve and --url take exactly one app')
+
+    if args.serve:
+        from werkzeug.serving import run_simple
+        bench = apps.load(args.apps[0], workdir, args.scale, args.seed)
+        run_simple('127.0.0.1', args.port, bench.app, threaded=True)
+        return
+
+    results = {}
+    for name in args.apps:
+        try:
+            # the server owns the data when driving it over http
+            bench = apps.load(name, workdir, args.scale, args.seed,
+                              populate=args.url is None)
+        except apps.Unavailable as e:
+            print('\n{}: skipped, {}'.format(name, e))
+            continue
+        results[name] = run(bench, args.users, args.duration, args.url, args.seed)
+        print_report(name, results[name])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
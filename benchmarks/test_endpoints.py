@@ -0,0 +1,36 @@
+import pytest
+
+from load import ClientSender
+
+# (app, scenario) pairs from apps.py, each timed on its own
+SCENARIOS = [
+    ('fyyur', 'venues'),
+    ('fyyur', 'venue'),
+    ('fyyur', 'artists'),
+    ('fyyur', 'artist'),
+    ('fyyur', 'shows'),
+    ('fyyur', 'search_venues'),
+    ('trivia', 'categories'),
+    ('trivia', 'questions_page'),
+    ('trivia', 'category_questions'),
+    ('trivia', 'search'),
+    ('trivia', 'quiz'),
+    ('coffee', 'drinks'),
+    ('coffee', 'drinks_detail'),
+    ('coffee', 'drinks_detail_new_token'),
+    ('recap', 'greetings'),
+    ('recap', 'greeting'),
+]
+
+
+@pytest.mark.parametrize('app_name,scenario_name', SCENARIOS)
+def test_endpoint(benchmark, load_app, rng, app_name, scenario_name):
+    bench = load_app(app_name)
+    build = {s.name: s.build for s in bench.scenarios}[scenario_name]
+    send = ClientSender(bench.app)
+
+    def request():
+        status = send(build(rng))
+        assert status < 400, status
+
+    benchmark(request)
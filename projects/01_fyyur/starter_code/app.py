@@ -5,17 +5,29 @@
 import json
 import dateutil.parser
 import babel
-import datetime
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import babel.dates
+from functools import lru_cache
+from datetime import datetime, timezone
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, stream_with_context
 from flask_moment import Moment
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, func
+from itertools import groupby
 import logging
 import copy
 from logging import Formatter, FileHandler
 from collections import UserDict    
 from flask_wtf import Form
 from forms import *
+from search import search_by_name
+from instrumentation import Instrumentation
+from db_pool import engine_options, setup_pool
+from replicas import ReplicaRouter, RoutingSQLAlchemy, read_from_replica
+from fast_json import FastJSON, jsonify
+import bulk
+import click
+import io
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -23,11 +35,17 @@ from forms import *
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+    app.config['SQLALCHEMY_DATABASE_URI'], app.config)
 # app.config["SQLALCHEMY_DATABASE_URI"] = 'postgresql://gsridhar@localhost:5432/fyyur'
 # app.config["DEBUG"] = True
 # app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy(app)
+replicas = ReplicaRouter(app, db)
 migrate = Migrate(app, db)
+instrumentation = Instrumentation(app)
+FastJSON(app)
+setup_pool(app, db.engine)
 # TODO: connect to a local postgresql database
 
 #----------------------------------------------------------------------------#
@@ -48,6 +66,8 @@ class Venue(db.Model):
     genres = db.Column(db.ARRAY(db.String(120)))    
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500), default="")
+    shows = db.relationship('Show', back_populates='venue', cascade='all, delete-orphan',
+                            passive_deletes=True, lazy='select')
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
 
@@ -63,6 +83,8 @@ class Artist(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500), default="")
+    shows = db.relationship('Show', back_populates='artist', cascade='all, delete-orphan',
+                            passive_deletes=True, lazy='select')
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
@@ -79,24 +101,20 @@ class Artist(db.Model):
 #     "start_time": "2019-05-21T21:30:00.000Z"
 #   }
 
-show_venue = db.Table('show_venue', 
-    db.Column('show_id', db.Integer, db.ForeignKey('show.id'), primary_key=True),
-    db.Column('venue_id', db.Integer, db.ForeignKey('venue.id'), primary_key=True)
-)
-
-show_artist = db.Table('show_artist', 
-    db.Column('show_id', db.Integer, db.ForeignKey('show.id'), primary_key=True),
-    db.Column('artist_id', db.Integer, db.ForeignKey('artist.id'), primary_key=True)
-)
-
 class Show(db.Model):
+    # association object between a venue and an artist. the foreign keys are
+    # covered by the (venue_id, start_time) and (artist_id, start_time) indexes
     __tablename__ = 'show'
     id = db.Column(db.Integer, primary_key=True)
-    artist_id = db.Column(db.Integer)
-    venue_id = db.Column(db.Integer)
-    start_time = db.Column(db.String(120))
-    artists = db.relationship('Artist', secondary=show_artist, backref=db.backref('artist_show', lazy=True))
-    venues = db.relationship('Venue', secondary=show_venue, backref=db.backref('venue_show'), lazy=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey('artist.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('venue.id', ondelete='CASCADE'), nullable=False)
+    start_time = db.Column(db.DateTime(timezone=True))
+    artist = db.relationship('Artist', back_populates='shows')
+    venue = db.relationship('Venue', back_populates='shows')
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+    )
 
 
 
@@ -106,13 +124,38 @@ class Show(db.Model):
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+# babel's named formats, used as babel defines them unless overridden above
+BABEL_FORMATS = ('full', 'long', 'medium', 'short')
+
+
+@lru_cache(maxsize=None)
+def _datetime_pattern(format):
+    return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+
+
+@lru_cache(maxsize=None)
+def _babel_locale(locale):
+    return babel.Locale.parse(locale)
+
+
+@lru_cache(maxsize=4096)
+def _format_datetime(value, format, locale):
+    # the same show times are rendered over and over on the listing pages,
+    # so recent results are memoized along with the compiled pattern
+    date = value if isinstance(value, datetime) else dateutil.parser.parse(value)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    if format in BABEL_FORMATS and format not in DATETIME_FORMATS:
+        return babel.dates.format_datetime(date, format, locale=_babel_locale(locale))
+    return _datetime_pattern(format).apply(date, _babel_locale(locale))
+
+
+def format_datetime(value, format='medium', locale=None):
+    return _format_datetime(value, format, locale or babel.dates.LC_TIME)
 
 
 app.jinja_env.filters['datetime'] = format_datetime
@@ -131,57 +174,47 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@read_from_replica
 def venues():
-    # TODO: replace with real venues data.
-    #       num_shows should be aggregated based on number of upcoming shows per venue.
-
-    # JOIN THE VENUE AND THE ARTIST tables
-    data = [{
-        "city": "San Francisco",
-        "state": "CA",
-        "venues": [{
-            "id": 1,
-            "name": "The Musical Hop",
-            "num_upcoming_shows": 0,
-        }, {
-            "id": 3,
-            "name": "Park Square Live Music & Coffee",
-            "num_upcoming_shows": 1,
-        }]
-    }, {
-        "city": "New York",
-        "state": "NY",
-        "venues": [{
-            "id": 2,
-            "name": "The Dueling Pianos Bar",
-            "num_upcoming_shows": 0,
-        }]
-    }]
-    venues = Venue.query.all()
-    venue_obj = {}
-    for venue in venues:
-        if f"{venue.city},{venue.state}" in venue_obj:
-            venue_obj[f"{venue.city},{venue.state}"].append({
-                "id" : venue.id,
-                "name": venue.name,
-            })
-        else:
-            venue_obj[f"{venue.city},{venue.state}"] = [{
-                "id" : venue.id,
-                "name": venue.name,
-            }]
+    page = max(request.args.get('page', 1, type=int), 1)
+    data, has_next = _get_venue_areas(page)
+    return render_template('pages/venues.html', areas=data, page=page,
+                           has_next=has_next)
+
+
+def _get_venue_areas(page, per_page=None):
+    # one grouped query: the page of (city, state) areas is picked in a
+    # subquery and every venue in it comes back with its upcoming show count.
+    # one area more than the page holds is read to know if there is a next
+    # page, returned as the second value
+    per_page = per_page or app.config.get('VENUE_AREAS_PER_PAGE', 20)
+    now = datetime.now(timezone.utc)
+    areas = db.session.query(Venue.city, Venue.state).\
+        group_by(Venue.city, Venue.state).\
+        order_by(Venue.state, Venue.city).\
+        limit(per_page + 1).offset((max(page, 1) - 1) * per_page).subquery()
+    rows = db.session.query(Venue.city, Venue.state, Venue.id, Venue.name,
+                            func.count(Show.id).label('num_upcoming_shows')).\
+        join(areas, and_(Venue.city == areas.c.city, Venue.state == areas.c.state)).\
+        outerjoin(Show, and_(Show.venue_id == Venue.id, Show.start_time >= now)).\
+        group_by(Venue.id, Venue.city, Venue.state, Venue.name).\
+        order_by(Venue.state, Venue.city, Venue.name).all()
     data = []
-    for location, venue_details in venue_obj.items():
-        city, state= location.split(',')
+    for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
         data.append({
             "city": city,
             "state": state,
-            "venues": venue_details
+            "venues": [{
+                "id": venue.id,
+                "name": venue.name,
+                "num_upcoming_shows": venue.num_upcoming_shows,
+            } for venue in venues]
         })
-    return render_template('pages/venues.html', areas=data)
+    return data[:per_page], len(data) > per_page
 
 
 @app.route('/venues/search', methods=['POST'])
+@read_from_replica
 def search_venues():
     # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
     # seach for Hop should return "The Musical Hop".
@@ -194,15 +227,19 @@ def search_venues():
     #         "num_upcoming_shows": 0,
     #     }]
     # }
-    search_string = f"%{request.form['search_term']}%"
-    venue_search = Venue.query.filter(Venue.name.ilike(search_string))
-    response = {}
-    response["data"] = venue_search.all()
-    response["count"] = venue_search.count()
+    response = search_by_name(db.session, Venue.__table__, Show.__table__, 'venue_id',
+                              request.form['search_term'], **_get_search_window())
     return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 
+def _get_search_window():
+    limit = request.form.get('limit', app.config.get('SEARCH_RESULTS_PER_PAGE', 20), type=int)
+    offset = request.form.get('offset', 0, type=int)
+    return {"limit": limit, "offset": offset}
+
+
 @app.route('/venues/<int:venue_id>')
+@read_from_replica
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
     # TODO: replace with real venue data from the venues table, using venue_id
@@ -285,24 +322,9 @@ def show_venue(venue_id):
     }
     # data = list(filter(lambda d: d['id'] ==
     #                    venue_id, [data1, data2, data3]))[0]
-    venue = Venue.query.filter_by(id=venue_id).first()
-    shows = db.session.query(Artist.id.label("artist_id"), Show.start_time, Venue.id, Artist.name.label("artist_name"), Artist.image_link.label("artist_image_link")).\
-        join(Show, Show.venue_id==Venue.id).\
-        join(Artist, Show.artist_id==Artist.id).filter(Venue.id==venue_id).all()
-    
-    data = {}
-    data['id'] = venue.id
-    data['name'] = venue.name
-    data['city'] = venue.city
-    data['state'] = venue.state
-    data['phone'] = venue.phone
-    data['facebook_link'] = venue.facebook_link
-    data['genres'] = venue.genres
-    data['seeking_talent'] = venue.seeking_talent
-    data['seeking_description'] = venue.seeking_description
-    data['image_link'] = venue.image_link
-    shows_data = _get_show_data(shows)
-    data.update(shows_data)
+    data = load_venues_with_shows([venue_id]).get(venue_id)
+    if data is None:
+        abort(404)
     return render_template('pages/show_venue.html', venue=data)
 
 #  Create Venue
@@ -353,11 +375,13 @@ def delete_venue(venue_id):
 
     # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
     # clicking that button delete it from the db then redirect the user to the homepage
-    return render_template('pages/venues.html')
+    # 303: the DELETE sent by static/js/script.js is followed with a GET
+    return redirect(url_for('venues'), code=303)
 
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@read_from_replica
 def artists():
     # TODO: replace with real data returned from querying the database
     # data = [{
@@ -375,6 +399,7 @@ def artists():
 
 
 @app.route('/artists/search', methods=['POST'])
+@read_from_replica
 def search_artists():
     # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
@@ -387,11 +412,8 @@ def search_artists():
     #         "num_upcoming_shows": 0,
     #     }]
     # }
-    response = {}
-    like_search_term = f"%{request.form['search_term']}%"
-    artists = Artist.query.filter(Artist.name.ilike(like_search_term))
-    response['data'] = artists.all()
-    response['count'] = artists.count()
+    response = search_by_name(db.session, Artist.__table__, Show.__table__, 'artist_id',
+                              request.form['search_term'], **_get_search_window())
     return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 @app.route('/artists/<artist_id>', methods=['DELETE'])
@@ -412,6 +434,7 @@ def delete_artist(artist_id):
     return render_template('pages/artists.html')
 
 @app.route('/artists/<int:artist_id>')
+@read_from_replica
 def show_artist(artist_id):
     # shows the venue page with the given venue_id
     # TODO: replace with real venue data from the venues table, using venue_id
@@ -486,46 +509,82 @@ def show_artist(artist_id):
         "past_shows_count": 0,
         "upcoming_shows_count": 3,
     }
-    artist = Artist.query.filter_by(id=artist_id).first()
-    shows = db.session.query(Artist.id, Show.start_time, Venue.id.label('venue_id'), Venue.name.label("venue_name"), Venue.image_link.label("venue_image_link")).\
-        join(Show, Show.artist_id==Artist.id).\
-        join(Venue, Show.venue_id==Venue.id).filter(Artist.id==artist_id).all()
-    
-    data = {}
-    data["id"] = artist.id
-    data["name"] = artist.name
-    data["genres"] = artist.genres
-    data["city"] = artist.city
-    data["state"] = artist.state
-    data["phone"] = artist.phone
-    data["seeking_venue"] = artist.seeking_venue
+    data = load_artists_with_shows([artist_id]).get(artist_id)
+    if data is None:
+        abort(404)
+    return render_template('pages/show_artist.html', artist=data)
+
+
+def _venue_data(venue):
+    return {
+        "id": venue.id,
+        "name": venue.name,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "facebook_link": venue.facebook_link,
+        "genres": venue.genres,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+    }
+
+
+def _artist_data(artist):
+    data = {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": artist.genres,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "seeking_venue": artist.seeking_venue,
+        "image_link": artist.image_link,
+    }
     if artist.seeking_venue:
         data["seeking_description"] = artist.seeking_description
-    data["image_link"] = artist.image_link
-    show_data = _get_show_data(shows)
-    data.update(show_data)
-    return render_template('pages/show_artist.html', artist=data)
+    return data
 
-def _get_show_data(shows):
-    data = {}
-    data["past_shows"] = []
-    data["upcoming_shows"] = []
-    upcoming_shows_count = 0
-    past_shows_count = 0
-    for show in shows:
-        show_date = datetime.strptime(show.start_time, '%Y-%m-%d %H:%M:%S')
-        current_date = datetime.now()
-        if show_date < current_date:
-            data["past_shows"].append(show)
-            past_shows_count += 1
-        else:
-            data["upcoming_shows"].append(show)
-            upcoming_shows_count += 1
-    data["upcoming_shows_count"] = upcoming_shows_count
-    data["past_shows_count"] = past_shows_count
+
+def _load_with_shows(model, ids, to_data, show_fk, other, other_fk, prefix):
+    # batched loader: one query for the entities, one for all of their shows.
+    # the database flags each show as upcoming so rows are only partitioned here
+    now = datetime.now(timezone.utc)
+    data = {entity.id: to_data(entity)
+            for entity in model.query.filter(model.id.in_(ids)).all()}
+    for entry in data.values():
+        entry.update(past_shows=[], upcoming_shows=[])
+    if data:
+        shows = db.session.query(
+            show_fk.label('owner_id'),
+            other.id.label(f'{prefix}_id'),
+            other.name.label(f'{prefix}_name'),
+            other.image_link.label(f'{prefix}_image_link'),
+            Show.start_time,
+            (Show.start_time >= now).label('is_upcoming')).\
+            join(other, other_fk == other.id).\
+            filter(show_fk.in_(list(data))).\
+            order_by(show_fk, Show.start_time).all()
+        for show in shows:
+            key = "upcoming_shows" if show.is_upcoming else "past_shows"
+            data[show.owner_id][key].append(show)
+    for entry in data.values():
+        entry["past_shows"].reverse()
+        entry["upcoming_shows_count"] = len(entry["upcoming_shows"])
+        entry["past_shows_count"] = len(entry["past_shows"])
     return data
 
 
+def load_venues_with_shows(venue_ids):
+    return _load_with_shows(Venue, venue_ids, _venue_data,
+                            Show.venue_id, Artist, Show.artist_id, 'artist')
+
+
+def load_artists_with_shows(artist_ids):
+    return _load_with_shows(Artist, artist_ids, _artist_data,
+                            Show.artist_id, Venue, Show.venue_id, 'venue')
+
+
 #  Update
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
@@ -634,6 +693,7 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@read_from_replica
 def shows():
     # displays list of shows at /shows
     # TODO: replace with real venues data.
@@ -674,25 +734,40 @@ def shows():
         "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
         "start_time": "2035-04-15T20:00:00.000Z"
     }]
-    # data = db.session.query(Show.venue_id, Show.artist_id, Show.start_time, Venue.name, Artist.name).\
-    #     filter(Show.venue_id == Venue.id).join(Artist).\
-    #         filter(Venue.id == Show.artist_id).all()
-
-    shows = Show.query.join(Venue, Show.venue_id == Venue.id).\
-                       join(Artist, Artist.id == Show.artist_id).add_columns(
-                           Show.venue_id, Show.artist_id, Artist.image_link.label('artist_image_link'),Show.start_time, Artist.name.label('artist_name'), 
-                           Venue.name.label('venue_name')).all()
-    data = []
-    for show in shows:
-        data.append({
-            "venue_id": show.venue_id,
-            "artist_id": show.artist_id,
-            "start_time": show.start_time,
-            "venue_name": show.venue_name,
-            "artist_name": show.artist_name,
-            "artist_image_link" : show.artist_image_link
-        })
-    return render_template('pages/shows.html', shows=shows)
+    # upcoming shows only unless ?start= / ?end= (YYYY-MM-DD) say otherwise.
+    # rows of the page are streamed from a server-side cursor straight into
+    # the template instead of being materialized as a list first
+    try:
+        start = dateutil.parser.parse(request.args['start']) if 'start' in request.args \
+            else datetime.now(timezone.utc)
+        end = dateutil.parser.parse(request.args['end']) if 'end' in request.args else None
+    except (ValueError, OverflowError):
+        abort(400)
+    start, end = [d.replace(tzinfo=timezone.utc) if d and d.tzinfo is None else d
+                  for d in (start, end)]
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = app.config.get('SHOWS_PER_PAGE', 100)
+
+    shows = db.session.query(Show.venue_id, Show.artist_id, Show.start_time,
+                             Artist.image_link.label('artist_image_link'),
+                             Artist.name.label('artist_name'),
+                             Venue.name.label('venue_name')).\
+        join(Venue, Show.venue_id == Venue.id).\
+        join(Artist, Artist.id == Show.artist_id).\
+        filter(Show.start_time >= start)
+    if end is not None:
+        shows = shows.filter(Show.start_time < end)
+    shows = shows.order_by(Show.start_time, Show.id).\
+        limit(per_page).offset((page - 1) * per_page).yield_per(per_page)
+    filters = {k: v for k, v in request.args.items() if k in ('start', 'end')}
+    return _stream_template('pages/shows.html', shows=shows, page=page,
+                            per_page=per_page, filters=filters)
+
+
+def _stream_template(template_name, **context):
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    return Response(stream_with_context(template.generate(**context)))
 
 
 @app.route('/shows/create')
@@ -709,7 +784,7 @@ def create_show_submission():
     try:
         show = Show(artist_id=request.form['artist_id'],
                     venue_id=request.form['venue_id'],
-                    start_time=request.form['start_time'])
+                    start_time=dateutil.parser.parse(request.form['start_time']))
         db.session.add(show)
         db.session.commit()
         flash('Show was successfully listed!')
@@ -722,6 +797,82 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
+#  Bulk import / export
+#  ----------------------------------------------------------------
+
+def _convert_show(data):
+    try:
+        data["artist_id"] = int(data["artist_id"])
+        data["venue_id"] = int(data["venue_id"])
+    except (KeyError, TypeError, ValueError):
+        return data, {"artist_id": 'artist_id and venue_id must be integers'}
+    return data, {}
+
+
+BULK_TARGETS = {
+    "venues": (Venue, bulk.compile_form_rules(VenueForm), None),
+    "artists": (Artist, bulk.compile_form_rules(ArtistForm), None),
+    "shows": (Show, bulk.compile_form_rules(ShowForm), _convert_show),
+}
+
+
+def _bulk_import(kind, stream, fmt, keep_ids=False):
+    model, validate, convert = BULK_TARGETS[kind]
+    return bulk.import_rows(db.engine, model.__table__, bulk.read_rows(stream, fmt),
+                            validate, convert, keep_ids=keep_ids)
+
+
+@app.route('/bulk/<kind>/import', methods=['POST'])
+def bulk_import(kind):
+    fmt = request.args.get('format', 'csv')
+    if kind not in BULK_TARGETS or fmt not in bulk.FORMATS:
+        abort(404)
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8')
+    try:
+        result = _bulk_import(kind, stream, fmt, keep_ids=request.args.get('keep_ids') == '1')
+    except ValueError as e:
+        # undecodable (not UTF-8) input, chunks read before it are already committed
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+
+@app.route('/bulk/<kind>/export')
+def bulk_export(kind):
+    fmt = request.args.get('format', 'csv')
+    if kind not in BULK_TARGETS or fmt not in bulk.FORMATS:
+        abort(404)
+    table = BULK_TARGETS[kind][0].__table__
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(bulk.export_rows(db.engine, table, fmt)),
+                    mimetype=mimetype)
+
+
+@app.cli.command('import-data')
+@click.argument('kind', type=click.Choice(list(BULK_TARGETS)))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(bulk.FORMATS), default='csv')
+@click.option('--keep-ids', is_flag=True, help='insert the id column of the source rows')
+def import_data_command(kind, source, fmt, keep_ids):
+    """Import venues, artists or shows from a CSV or NDJSON file."""
+    try:
+        result = _bulk_import(kind, source, fmt, keep_ids=keep_ids)
+    except ValueError as e:
+        raise click.ClickException('could not read {}: {}'.format(source.name, e))
+    click.echo('{} {} imported'.format(result["inserted"], kind))
+    for error in result["errors"]:
+        click.echo('line {line}: {errors}'.format(**error), err=True)
+
+
+@app.cli.command('export-data')
+@click.argument('kind', type=click.Choice(list(BULK_TARGETS)))
+@click.argument('target', type=click.File('w', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(bulk.FORMATS), default='csv')
+def export_data_command(kind, target, fmt):
+    """Export venues, artists or shows to a CSV or NDJSON file."""
+    for chunk in bulk.export_rows(db.engine, BULK_TARGETS[kind][0].__table__, fmt):
+        target.write(chunk)
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
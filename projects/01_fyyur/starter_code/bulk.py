@@ -0,0 +1,258 @@
+import csv
+import inspect
+import json
+from datetime import datetime, timezone
+from wtforms import BooleanField, DateTimeField, SelectMultipleField
+from wtforms.fields.core import UnboundField
+from wtforms.validators import DataRequired, URL
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
+
+# Bulk import / export of venues, artists and shows.
+#
+# Rows are streamed from CSV or NDJSON, checked against the rules declared on
+# the forms.py classes (compiled once per form, no WTForms object per row)
+# and inserted with one executemany per chunk, committed chunk by chunk. A
+# chunk the database rejects (e.g. a show pointing at an unknown venue) is
+# retried row by row under savepoints, so only the offending rows are left
+# out and reported. Exports stream rows from a server-side cursor.
+#
+# In CSV files multi-valued fields (genres) are separated by MULTI_SEPARATOR.
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+MULTI_SEPARATOR = ';'
+FORMATS = ('csv', 'ndjson')
+
+
+def compile_form_rules(form_class):
+    # reads the unbound fields of a form once and returns a function that
+    # validates and converts a plain dict the way the form would
+    rules = []
+    for name, field in inspect.getmembers(form_class, lambda m: isinstance(m, UnboundField)):
+        validators = field.kwargs.get('validators') or []
+        choices = field.kwargs.get('choices')
+        rules.append({
+            "name": name,
+            "required": any(isinstance(v, DataRequired) for v in validators),
+            "urls": [v.regex for v in validators if isinstance(v, URL)],
+            "choices": {value for value, _ in choices} if choices else None,
+            "multiple": issubclass(field.field_class, SelectMultipleField),
+            "boolean": issubclass(field.field_class, BooleanField),
+            "datetime": issubclass(field.field_class, DateTimeField),
+            "datetime_format": field.kwargs.get('format', '%Y-%m-%d %H:%M:%S'),
+        })
+
+    def validate(row):
+        data = {}
+        errors = {}
+        for rule in rules:
+            name = rule["name"]
+            value = row.get(name)
+            # NDJSON values can be of any JSON type: they are checked, or
+            # numbers turned into text, before the rules below look at them
+            if rule["multiple"]:
+                if isinstance(value, str):
+                    value = value.split(MULTI_SEPARATOR)
+                if value is None:
+                    value = []
+                if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                    errors[name] = 'Not a valid list of strings'
+                    continue
+                value = [v.strip() for v in value if v.strip()]
+            elif rule["boolean"]:
+                pass
+            elif rule["datetime"]:
+                if isinstance(value, str):
+                    value = value.strip()
+                elif value is not None and not isinstance(value, datetime):
+                    errors[name] = 'Not a valid datetime value'
+                    continue
+            elif value is not None:
+                value = _text(value)
+                if value is None:
+                    errors[name] = 'Not a valid string'
+                    continue
+            if rule["required"] and not value:
+                errors[name] = 'This field is required.'
+                continue
+            if rule["boolean"]:
+                value = value in (True, 'y', 'true', 'True', '1', 1)
+            elif rule["datetime"] and value:
+                if not isinstance(value, datetime):
+                    value = _parse_datetime(value, rule["datetime_format"])
+                if value is None:
+                    errors[name] = 'Not a valid datetime value'
+                    continue
+                if value.tzinfo is None:
+                    value = value.replace(tzinfo=timezone.utc)
+            elif rule["choices"] is not None and value:
+                invalid = [v for v in (value if rule["multiple"] else [value])
+                           if v not in rule["choices"]]
+                if invalid:
+                    errors[name] = 'Not a valid choice: {}'.format(', '.join(invalid))
+                    continue
+            if any(not regex.match(value or '') for regex in rule["urls"]):
+                errors[name] = 'Invalid URL.'
+                continue
+            data[name] = value if value != '' else None
+        return data, errors
+
+    return validate
+
+
+def _text(value):
+    # the text of a scalar value, None for lists, objects and booleans
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return None
+
+
+def _parse_datetime(value, format):
+    # the form's own format first, then ISO 8601 as written by the exports
+    try:
+        return datetime.strptime(value, format)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+class InvalidRow:
+    # stands in for a source line that could not be read as a row
+    def __init__(self, message):
+        self.message = message
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'ndjson':
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield InvalidRow('Invalid JSON: {}'.format(e))
+    else:
+        raise ValueError('unknown format {}'.format(fmt))
+
+
+def _database_error(error):
+    # first line of the driver's message, e.g. the violated constraint
+    message = str(getattr(error, 'orig', error)).strip()
+    return message.splitlines()[0] if message else type(error).__name__
+
+
+def import_rows(engine, table, rows, validate, convert=None,
+                keep_ids=False, chunk_size=CHUNK_SIZE):
+    # keep_ids inserts the id column of the source rows, so shows exported
+    # with their venue/artist ids can be imported alongside them
+    inserted = 0
+    errors = []
+    chunk = []
+
+    def report(line, row_errors):
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": line, "errors": row_errors})
+
+    def flush():
+        try:
+            with engine.begin() as connection:
+                connection.execute(table.insert(), [data for _, data in chunk])
+            count = len(chunk)
+        except DBAPIError:
+            count = 0
+            with engine.begin() as connection:
+                for line, data in chunk:
+                    savepoint = connection.begin_nested()
+                    try:
+                        connection.execute(table.insert(), data)
+                        savepoint.commit()
+                        count += 1
+                    except DBAPIError as e:
+                        savepoint.rollback()
+                        report(line, {"row": _database_error(e)})
+        chunk.clear()
+        return count
+
+    for line, row in enumerate(rows, start=1):
+        if isinstance(row, InvalidRow):
+            report(line, {"row": row.message})
+            continue
+        if not isinstance(row, dict):
+            report(line, {"row": 'Not a JSON object'})
+            continue
+        data, row_errors = validate(row)
+        if keep_ids and not row_errors:
+            try:
+                data["id"] = int(row["id"])
+            except (KeyError, TypeError, ValueError):
+                row_errors = {"id": 'Not a valid integer value'}
+        if not row_errors and convert is not None:
+            data, row_errors = convert(data)
+        if row_errors:
+            report(line, row_errors)
+            continue
+        chunk.append((line, data))
+        if len(chunk) >= chunk_size:
+            inserted += flush()
+    if chunk:
+        inserted += flush()
+    if keep_ids and inserted and engine.dialect.name == 'postgresql':
+        with engine.begin() as connection:
+            connection.execute(
+                "SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                "(SELECT max(id) FROM \"{0}\"))".format(table.name))
+    # the database rejects rows after later lines were checked, keep line order
+    errors.sort(key=lambda error: error["line"])
+    return {"inserted": inserted, "errors": errors}
+
+
+def export_rows(engine, table, fmt, chunk_size=CHUNK_SIZE):
+    # generator of text chunks, reading from a server-side cursor
+    columns = [column.name for column in table.columns]
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).\
+            execute(select([table]).order_by(table.c.id))
+        if fmt == 'csv':
+            yield _csv_line(columns)
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            if fmt == 'csv':
+                yield ''.join(_csv_line([_csv_value(row[c]) for c in columns]) for row in rows)
+            else:
+                yield ''.join(json.dumps({c: _json_value(row[c]) for c in columns}) + '\n'
+                              for row in rows)
+
+
+class _LineBuffer:
+    def write(self, line):
+        return line
+
+
+_csv_writer = csv.writer(_LineBuffer())
+
+
+def _csv_line(values):
+    return _csv_writer.writerow(values)
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return MULTI_SEPARATOR.join(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
@@ -10,5 +10,29 @@ DEBUG = True
 
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://gsridhar@localhost:5432/fyyur'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://gsridhar@localhost:5432/fyyur')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Number of city/state groups rendered per page on /venues
+VENUE_AREAS_PER_PAGE = 20
+
+# Maximum number of venue/artist search results returned per request
+SEARCH_RESULTS_PER_PAGE = 20
+
+# Number of shows streamed per page on /shows
+SHOWS_PER_PAGE = 100
+
+# Queries and requests slower than this (in ms) are logged, see instrumentation.py
+SLOW_QUERY_MS = 100
+SLOW_REQUEST_MS = 500
+
+# Connection pool: DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+# DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT_MS and
+# DB_POOL_WARMUP can be set here or in the environment, see db_pool.py
+DB_POOL_WARMUP = int(os.environ.get('DB_POOL_WARMUP', 2))
+
+# Read replicas used by the listing, search and detail pages, see replicas.py
+REPLICA_URIS = [uri for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri]
+REPLICA_MAX_LAG_SECONDS = 5
+REPLICA_STICKY_SECONDS = 10
+REPLICA_CONNECT_TIMEOUT = 2
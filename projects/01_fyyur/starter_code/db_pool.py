@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+
+# Connection pool settings and pool saturation metrics.
+#
+# engine_options() turns the DB_* settings below into the
+# SQLALCHEMY_ENGINE_OPTIONS of the app; each one is read from the app
+# config, then from the environment. setup_pool() registers the pool
+# metrics, which instrumentation.py adds to /metrics, and warms the pool up
+# in the background once the first request comes in: importing the app,
+# for a CLI command or a migration, opens no connection.
+#
+# sqlite keeps Flask-SQLAlchemy's defaults: its connections cannot be
+# shared between threads, so there is no pool to tune.
+
+DEFAULTS = {
+    'DB_POOL_SIZE': 5,
+    'DB_MAX_OVERFLOW': 10,
+    # seconds to wait for a connection before giving up
+    'DB_POOL_TIMEOUT': 30,
+    # seconds after which a connection is replaced, below the server's idle timeout
+    'DB_POOL_RECYCLE': 1800,
+    'DB_POOL_PRE_PING': True,
+    # postgres statement_timeout, 0 for none
+    'DB_STATEMENT_TIMEOUT_MS': 0,
+    # connections opened when the first request comes in
+    'DB_POOL_WARMUP': 0,
+}
+
+
+def setting(config, key):
+    value = config.get(key, os.environ.get(key, DEFAULTS[key]))
+    if isinstance(DEFAULTS[key], bool) and isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return type(DEFAULTS[key])(value)
+
+
+def engine_options(url, config):
+    url = make_url(url)
+    if url.drivername.startswith('sqlite'):
+        return {}
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': setting(config, 'DB_POOL_SIZE'),
+        'max_overflow': setting(config, 'DB_MAX_OVERFLOW'),
+        'pool_timeout': setting(config, 'DB_POOL_TIMEOUT'),
+        'pool_recycle': setting(config, 'DB_POOL_RECYCLE'),
+        'pool_pre_ping': setting(config, 'DB_POOL_PRE_PING'),
+    }
+    statement_timeout = setting(config, 'DB_STATEMENT_TIMEOUT_MS')
+    if statement_timeout and url.drivername.startswith('postgres'):
+        options['connect_args'] = {
+            'options': '-c statement_timeout={}'.format(statement_timeout)}
+    return options
+
+
+class InstrumentedQueuePool(QueuePool):
+    # QueuePool counting the checkouts that wait for a connection to come
+    # back to the pool and the time they spend waiting. a checkout served
+    # by an idle connection, or by opening a new one while max_overflow
+    # allows it, does not wait
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.waiters = 0
+        self.acquisitions = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        # the condition QueuePool blocks on: no idle connection and no room
+        # left for an overflow one
+        waits = (self._max_overflow > -1 and self._overflow >= self._max_overflow
+                 and self._pool.empty())
+        if not waits:
+            with self._stats_lock:
+                self.acquisitions += 1
+            return super()._do_get()
+        started = time.perf_counter()
+        with self._stats_lock:
+            self.waiters += 1
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.waiters -= 1
+                self.acquisitions += 1
+                self.wait_time += waited
+                self.max_wait_time = max(self.max_wait_time, waited)
+
+
+class PoolMetrics:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def metric_lines(self):
+        pool = self.engine.pool
+        if not isinstance(pool, InstrumentedQueuePool):
+            return
+        for name, kind, help, value in (
+                ('db_pool_size', 'gauge', 'Connections kept in the pool.', pool.size()),
+                ('db_pool_checked_out', 'gauge', 'Connections in use.', pool.checkedout()),
+                ('db_pool_overflow', 'gauge', 'Connections open beyond the pool size.',
+                 max(pool.overflow(), 0)),
+                ('db_pool_waiters', 'gauge', 'Checkouts waiting for a connection.',
+                 pool.waiters),
+                ('db_pool_checkouts_total', 'counter', 'Connection checkouts, including the ones that timed out.',
+                 pool.acquisitions),
+                ('db_pool_wait_seconds_total', 'counter',
+                 'Time spent waiting for a connection to be returned to the pool.',
+                 pool.wait_time),
+                ('db_pool_max_wait_seconds', 'gauge',
+                 'Longest wait for a connection to be returned to the pool.',
+                 pool.max_wait_time),
+                ('db_pool_timeouts_total', 'counter',
+                 'Checkouts that gave up after DB_POOL_TIMEOUT.', pool.timeouts)):
+            yield '# HELP {} {}'.format(name, help)
+            yield '# TYPE {} {}'.format(name, kind)
+            yield '{} {}'.format(name, value)
+
+
+def warm_up(engine, connections):
+    # open the connections up front so the first requests don't pay for them
+    opened = []
+    try:
+        for _ in range(connections):
+            opened.append(engine.connect())
+    finally:
+        for connection in opened:
+            connection.close()
+
+
+def setup_pool(app, engine):
+    app.extensions['db_pool'] = PoolMetrics(engine)
+    connections = setting(app.config, 'DB_POOL_WARMUP')
+    if not connections or not isinstance(engine.pool, InstrumentedQueuePool):
+        return
+
+    def run():
+        try:
+            warm_up(engine, connections)
+        except Exception:
+            app.logger.exception('could not warm up the connection pool')
+
+    @app.before_first_request
+    def start_warm_up():
+        # the first request opens its own connection, the others are
+        # opened for the requests after it
+        threading.Thread(target=run, daemon=True).start()
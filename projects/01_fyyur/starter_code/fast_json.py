@@ -0,0 +1,125 @@
+import json
+
+from flask import current_app, has_app_context, jsonify as flask_jsonify, stream_with_context
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON responses through a faster encoder.
+#
+#     FastJSON(app)
+#
+#     return jsonify({...})             # drop-in for flask.jsonify
+#     return json_response(encoded)     # bytes already encoded, e.g. cached
+#     return stream_json({...}, 'items', rows, lambda count: {...})
+#
+# JSON_BACKEND picks the encoder: 'orjson', 'json' (the stdlib) or 'auto',
+# orjson when it is installed. Values orjson does not encode itself, dates
+# included, go through the app's json_encoder like they do in
+# flask.jsonify; keys are sorted unless JSON_SORT_KEYS is off. orjson
+# writes UTF-8 rather than \u escapes, whatever JSON_AS_ASCII says.
+# Pretty printed responses (debug mode) are left to flask.jsonify.
+
+STREAM_CHUNK_SIZE = 500
+
+
+def make_dumps(backend='auto', sort_keys=True, ensure_ascii=True, default=None):
+    # a function encoding a value to bytes with the given backend
+    if backend == 'auto':
+        backend = 'json' if orjson is None else 'orjson'
+    if backend == 'orjson':
+        if orjson is None:
+            raise RuntimeError('JSON_BACKEND is orjson but orjson is not installed')
+        option = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME |
+                  orjson.OPT_PASSTHROUGH_DATACLASS)
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return lambda obj: orjson.dumps(obj, default=default, option=option)
+    if backend != 'json':
+        raise ValueError('unknown JSON_BACKEND {!r}'.format(backend))
+    encoder = json.JSONEncoder(separators=(',', ':'), sort_keys=sort_keys,
+                               ensure_ascii=ensure_ascii, default=default)
+    return lambda obj: encoder.encode(obj).encode('utf-8')
+
+
+class FastJSON:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.dumps = make_dumps(app.config.get('JSON_BACKEND', 'auto'),
+                                sort_keys=app.config['JSON_SORT_KEYS'],
+                                ensure_ascii=app.config['JSON_AS_ASCII'],
+                                default=self._default)
+        app.extensions['fast_json'] = self
+
+    def _default(self, obj):
+        return self.app.json_encoder().default(obj)
+
+
+def _extension():
+    if has_app_context():
+        return current_app.extensions.get('fast_json')
+    return None
+
+
+def dumps(obj):
+    # bytes, through the app's FastJSON when it has one
+    extension = _extension()
+    if extension is None:
+        return make_dumps('json')(obj)
+    return extension.dumps(obj)
+
+
+def jsonify(*args, **kwargs):
+    extension = _extension()
+    if (extension is None or current_app.debug or
+            current_app.config['JSONIFY_PRETTYPRINT_REGULAR']):
+        return flask_jsonify(*args, **kwargs)
+    if args and kwargs:
+        raise TypeError('jsonify() behavior undefined when passed both args and kwargs')
+    data = args[0] if len(args) == 1 else args or kwargs
+    return json_response(extension.dumps(data) + b'\n')
+
+
+def json_response(encoded, status=200):
+    # a response for a body that is already encoded, served as is
+    mimetype = current_app.config['JSONIFY_MIMETYPE']
+    return current_app.response_class(encoded, status=status, mimetype=mimetype)
+
+
+def stream_json(head, key, items, tail=None, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    A streamed response for {**head, key: [*items], **tail(count)}.
+
+    The items are encoded and sent chunk_size at a time, so a large list
+    never sits in memory as a whole; tail is called with the number of
+    items once they are all sent, e.g. for a total. Keys of head and tail
+    stay in the given order.
+    """
+    extension = _extension()
+    encode = make_dumps('json') if extension is None else extension.dumps
+
+    def generate():
+        opening = encode(head)[:-1]
+        yield opening + (b',' if len(opening) > 1 else b'') + encode(key) + b':['
+        count = 0
+        chunk = []
+        for item in items:
+            chunk.append(encode(item))
+            if len(chunk) == chunk_size:
+                yield (b',' if count else b'') + b','.join(chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            yield (b',' if count else b'') + b','.join(chunk)
+            count += len(chunk)
+        closing = encode(tail(count) if tail else {})[1:]
+        yield b']' + (b',' if len(closing) > 1 else b'') + closing + b'\n'
+
+    # the body is sent after the view returns, keep its request context
+    return json_response(stream_with_context(generate()))
@@ -0,0 +1,36 @@
+"""show start_time as timestamp
+
+Revision ID: 5c3e8a1f0d27
+Revises: 92bef09cf7f1
+Create Date: 2020-04-12 18:02:41.517330
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c3e8a1f0d27'
+down_revision = '92bef09cf7f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column('show', 'start_time',
+               existing_type=sa.String(length=120),
+               type_=sa.DateTime(timezone=True),
+               existing_nullable=True,
+               postgresql_using='start_time::timestamp with time zone')
+    op.create_index('ix_show_venue_id_start_time', 'show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_show_artist_id_start_time', 'show', ['artist_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_artist_id_start_time', table_name='show')
+    op.drop_index('ix_show_venue_id_start_time', table_name='show')
+    op.alter_column('show', 'start_time',
+               existing_type=sa.DateTime(timezone=True),
+               type_=sa.String(length=120),
+               existing_nullable=True,
+               postgresql_using="to_char(start_time, 'YYYY-MM-DD HH24:MI:SS')")
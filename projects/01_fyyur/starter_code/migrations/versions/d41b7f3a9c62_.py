@@ -0,0 +1,65 @@
+"""show as an association object between venue and artist
+
+Revision ID: d41b7f3a9c62
+Revises: a7d2c9e41b58
+Create Date: 2020-04-19 16:48:12.093355
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41b7f3a9c62'
+down_revision = 'a7d2c9e41b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # fill the show columns from the old secondary tables where they were
+    # the only link, then drop the rows that still point nowhere
+    op.execute('''
+        UPDATE show SET venue_id = show_venue.venue_id
+          FROM show_venue
+         WHERE show_venue.show_id = show.id AND show.venue_id IS NULL
+    ''')
+    op.execute('''
+        UPDATE show SET artist_id = show_artist.artist_id
+          FROM show_artist
+         WHERE show_artist.show_id = show.id AND show.artist_id IS NULL
+    ''')
+    op.execute('''
+        DELETE FROM show
+         WHERE venue_id IS NULL OR venue_id NOT IN (SELECT id FROM venue)
+            OR artist_id IS NULL OR artist_id NOT IN (SELECT id FROM artist)
+    ''')
+    op.drop_table('show_venue')
+    op.drop_table('show_artist')
+    op.alter_column('show', 'venue_id', existing_type=sa.Integer(), nullable=False)
+    op.alter_column('show', 'artist_id', existing_type=sa.Integer(), nullable=False)
+    op.create_foreign_key('show_venue_id_fkey', 'show', 'venue', ['venue_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('show_artist_id_fkey', 'show', 'artist', ['artist_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    op.drop_constraint('show_artist_id_fkey', 'show', type_='foreignkey')
+    op.drop_constraint('show_venue_id_fkey', 'show', type_='foreignkey')
+    op.alter_column('show', 'artist_id', existing_type=sa.Integer(), nullable=True)
+    op.alter_column('show', 'venue_id', existing_type=sa.Integer(), nullable=True)
+    op.create_table('show_artist',
+    sa.Column('show_id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['artist.id'], ),
+    sa.ForeignKeyConstraint(['show_id'], ['show.id'], ),
+    sa.PrimaryKeyConstraint('show_id', 'artist_id')
+    )
+    op.create_table('show_venue',
+    sa.Column('show_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['show_id'], ['show.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ),
+    sa.PrimaryKeyConstraint('show_id', 'venue_id')
+    )
+    op.execute('INSERT INTO show_artist (show_id, artist_id) SELECT id, artist_id FROM show')
+    op.execute('INSERT INTO show_venue (show_id, venue_id) SELECT id, venue_id FROM show')
@@ -0,0 +1,39 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+
+# Counts the statements an engine executes, to pin down the number of
+# queries a view issues and catch N+1 regressions in tests:
+#
+#     with assert_max_queries(db.engine, 3):
+#         client.get('/venues/1')
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(engine):
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter._record)
+
+
+@contextmanager
+def assert_max_queries(engine, expected):
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count > expected:
+        raise AssertionError('{} queries executed, {} expected:\n{}'.format(
+            counter.count, expected, '\n'.join(counter.statements)))
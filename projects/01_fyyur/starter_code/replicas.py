@@ -0,0 +1,164 @@
+import random
+import threading
+import time
+from functools import wraps
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import orm, text
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.sql.expression import Select
+
+# Read-replica routing.
+#
+# Views decorated with @read_from_replica run their SELECTs on one of the
+# REPLICA_URIS, everything else (any other statement, any flush) goes to
+# the primary:
+#
+#     db = RoutingSQLAlchemy(app)
+#     replicas = ReplicaRouter(app, db)
+#
+#     @app.route('/venues')
+#     @read_from_replica
+#     def venues(): ...
+#
+# After a successful write (any other POST/DELETE) the client gets a cookie
+# keeping its reads on the primary for REPLICA_STICKY_SECONDS, so it sees
+# its own changes. A replica is skipped while it lags behind the primary by
+# more than REPLICA_MAX_LAG_SECONDS or cannot be reached within
+# REPLICA_CONNECT_TIMEOUT, checked at most every REPLICA_CHECK_INTERVAL
+# seconds by a single request while the others keep the last result. A
+# replica is not used until its first check passed; with no replica
+# available the primary serves the reads.
+#
+# Needs Flask-SQLAlchemy 2.x (SignallingSession), see requirements.txt.
+
+STICKY_COOKIE = 'fyyur_primary_until'
+
+# seconds a postgres standby is behind, 0 when it replayed everything it
+# received (an idle primary is not lag) or when this is not a standby
+POSTGRES_LAG = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+def read_from_replica(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g._read_from_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _with_connect_timeout(uri, seconds):
+    # a dead replica fails its health check quickly instead of hanging
+    url = make_url(uri)
+    if url.drivername.startswith('postgres') and 'connect_timeout' not in url.query:
+        url.query = dict(url.query, connect_timeout=str(seconds))
+    return str(url)
+
+
+class RoutingSession(SignallingSession):
+    def get_bind(self, mapper=None, clause=None):
+        router = self.app.extensions.get('replicas')
+        if router is not None and not self._flushing and isinstance(clause, Select):
+            engine = router.engine_for_request()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+class ReplicaRouter:
+    def __init__(self, app=None, db=None):
+        self._lock = threading.Lock()
+        self._health = {}
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.app = app
+        self.db = db
+        self.max_lag = app.config.get('REPLICA_MAX_LAG_SECONDS', 5)
+        self.check_interval = app.config.get('REPLICA_CHECK_INTERVAL', 10)
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 10)
+        connect_timeout = app.config.get('REPLICA_CONNECT_TIMEOUT', 2)
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {}) or {}
+        self.binds = []
+        for index, uri in enumerate(app.config.get('REPLICA_URIS') or []):
+            bind = 'replica_{}'.format(index)
+            binds[bind] = _with_connect_timeout(uri, connect_timeout)
+            self.binds.append(bind)
+        app.config['SQLALCHEMY_BINDS'] = binds
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.extensions['replicas'] = self
+
+    def engine_for_request(self):
+        if not self.binds or not has_request_context():
+            return None
+        if not g.get('_read_from_replica') or self._sticky():
+            return None
+        # one replica per request, so a view sees a consistent snapshot
+        if '_replica_bind' not in g:
+            healthy = [bind for bind in self.binds if self._healthy(bind)]
+            g._replica_bind = random.choice(healthy) if healthy else None
+        if g._replica_bind is None:
+            return None
+        return self.db.get_engine(self.app, bind=g._replica_bind)
+
+    def lag(self, bind):
+        engine = self.db.get_engine(self.app, bind=bind)
+        with engine.connect() as connection:
+            if engine.dialect.name == 'postgresql':
+                return float(connection.execute(POSTGRES_LAG).scalar())
+            connection.execute(text('SELECT 1'))
+            return 0.0
+
+    def _healthy(self, bind):
+        now = time.monotonic()
+        with self._lock:
+            healthy, checked_at = self._health.get(bind, (False, None))
+            if checked_at is not None and now - checked_at < self.check_interval:
+                return healthy
+            # this request checks, the others keep the last result meanwhile
+            self._health[bind] = (healthy, now)
+        try:
+            lag = self.lag(bind)
+            healthy = lag <= self.max_lag
+            if not healthy:
+                self.app.logger.warning('replica %s lags by %.1fs, reading from the primary',
+                                        bind, lag)
+        except Exception:
+            self.app.logger.exception('replica %s unavailable, reading from the primary', bind)
+            healthy = False
+        with self._lock:
+            self._health[bind] = (healthy, time.monotonic())
+        return healthy
+
+    def _sticky(self):
+        try:
+            return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def _before_request(self):
+        g.pop('_read_from_replica', None)
+        g.pop('_replica_bind', None)
+
+    def _after_request(self, response):
+        # read-your-writes: a successful write pins the client to the primary
+        if (self.binds and request.method not in ('GET', 'HEAD', 'OPTIONS') and
+                not g.get('_read_from_replica') and response.status_code < 400):
+            until = time.time() + self.sticky_seconds
+            response.set_cookie(STICKY_COOKIE, '{:.0f}'.format(until),
+                                max_age=self.sticky_seconds, httponly=True)
+        return response
@@ -0,0 +1,32 @@
+from datetime import datetime, timezone
+from sqlalchemy import and_, func, select
+
+# Name search for venues and artists.
+#
+# The lookup is an ILIKE served by the pg_trgm GIN index created in
+# migration a7d2c9e41b58, ranked by trigram similarity.  A single statement
+# returns the page of results, the upcoming show count of every row and the
+# total number of matches.
+
+
+def search_by_name(session, table, show_table, show_fk, term, limit=20, offset=0):
+    now = datetime.now(timezone.utc)
+    upcoming = select([func.count()]).\
+        where(and_(show_table.c[show_fk] == table.c.id,
+                   show_table.c.start_time >= now)).\
+        as_scalar()
+    query = select([table.c.id, table.c.name,
+                    upcoming.label('num_upcoming_shows'),
+                    func.count().over().label('total')]).\
+        where(table.c.name.ilike(f"%{term}%")).\
+        order_by(func.similarity(table.c.name, term).desc(), table.c.name).\
+        limit(limit).offset(offset)
+    rows = session.execute(query).fetchall()
+    return {
+        "count": rows[0].total if rows else 0,
+        "data": [{
+            "id": row.id,
+            "name": row.name,
+            "num_upcoming_shows": row.num_upcoming_shows,
+        } for row in rows]
+    }
@@ -0,0 +1,396 @@
+import json
+import os
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import babel.dates
+from flask_sqlalchemy import get_state
+from sqlalchemy.exc import OperationalError
+
+# the app reads its database from the environment when it is imported
+os.environ['DATABASE_URL'] = os.environ.get(
+    'TEST_DATABASE_URL', 'postgresql://localhost:5432/fyyur_test')
+
+REPLICA_DATABASE_URL = os.environ.get(
+    'TEST_REPLICA_DATABASE_URL', 'postgresql://localhost:5432/fyyur_test_replica')
+
+from app import app, db, format_datetime, replicas, Venue, Artist, Show
+from query_count import assert_max_queries, count_queries
+from replicas import STICKY_COOKIE
+
+VENUES = 3
+ARTISTS = 3
+SHOWS_PER_VENUE = 6
+
+
+class QueryCountTestCase(unittest.TestCase):
+    """Number of queries of the listing and detail pages.
+
+    Every venue and artist has past and upcoming shows, so a page loading
+    them one by one (N+1) goes over its limit. Venues and artists use
+    ARRAY columns: the tests need the postgres database of TEST_DATABASE_URL
+    and are skipped when it cannot be reached.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        app.config['WTF_CSRF_ENABLED'] = False
+        with app.app_context():
+            try:
+                db.drop_all()
+            except OperationalError as e:
+                raise unittest.SkipTest('no test database: {}'.format(e.orig))
+            db.create_all()
+            now = datetime.now(timezone.utc)
+            for i in range(1, VENUES + 1):
+                # the last venue in an area of its own, for the pager
+                city, state = ('Austin', 'TX') if i == VENUES else ('San Francisco', 'CA')
+                db.session.add(Venue(id=i, name='Venue {}'.format(i), city=city,
+                                     state=state, address='{} Main St'.format(i),
+                                     genres=['Jazz']))
+            for i in range(1, ARTISTS + 1):
+                db.session.add(Artist(id=i, name='Artist {}'.format(i), city='San Francisco',
+                                      state='CA', genres=['Jazz']))
+            db.session.flush()
+            for venue_id in range(1, VENUES + 1):
+                for i in range(SHOWS_PER_VENUE):
+                    days = (i + 1) * (1 if i % 2 else -1)
+                    db.session.add(Show(venue_id=venue_id, artist_id=i % ARTISTS + 1,
+                                        start_time=now + timedelta(days=days)))
+            db.session.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def get(self, path, max_queries):
+        with assert_max_queries(db.engine, max_queries):
+            # buffered: streamed pages run their queries while being read
+            res = self.client.get(path, buffered=True)
+        self.assertEqual(res.status_code, 200)
+        return res
+
+    def test_venues(self):
+        res = self.get('/venues', 1)
+        self.assertIn(b'Venue 3', res.data)
+
+    def test_venues_pager(self):
+        per_page = app.config['VENUE_AREAS_PER_PAGE']
+        app.config['VENUE_AREAS_PER_PAGE'] = 1
+        try:
+            first = self.get('/venues', 1)
+            last = self.get('/venues?page=2', 1)
+        finally:
+            app.config['VENUE_AREAS_PER_PAGE'] = per_page
+        self.assertIn(b'href="/venues?page=2">Next', first.data)
+        self.assertNotIn(b'Previous', first.data)
+        self.assertIn(b'href="/venues?page=1">Previous', last.data)
+        self.assertNotIn(b'Next', last.data)
+
+    def test_delete_venue(self):
+        with app.app_context():
+            db.session.add(Venue(id=100, name='Venue to delete', city='Austin', state='TX'))
+            db.session.commit()
+        res = self.client.delete('/venues/100')
+        self.assertEqual(res.status_code, 303)
+        self.assertTrue(res.location.endswith('/venues'))
+        with app.app_context():
+            self.assertIsNone(Venue.query.get(100))
+
+    def test_venue(self):
+        res = self.get('/venues/1', 2)
+        self.assertIn(b'Artist 3', res.data)
+
+    def test_artists(self):
+        res = self.get('/artists', 1)
+        self.assertIn(b'Artist 3', res.data)
+
+    def test_artist(self):
+        res = self.get('/artists/1', 2)
+        self.assertIn(b'Venue 3', res.data)
+
+    def test_shows(self):
+        res = self.get('/shows', 1)
+        self.assertIn(b'Venue 3', res.data)
+
+
+class BulkTestCase(unittest.TestCase):
+    """Bulk import and export of venues, artists and shows (bulk.py)."""
+
+    @classmethod
+    def setUpClass(cls):
+        with app.app_context():
+            try:
+                db.drop_all()
+            except OperationalError as e:
+                raise unittest.SkipTest('no test database: {}'.format(e.orig))
+            db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.clear()
+
+    def clear(self):
+        with app.app_context():
+            for model in (Show, Venue, Artist):
+                model.query.delete()
+            db.session.commit()
+
+    def import_data(self, kind, data, fmt, keep_ids=False):
+        res = self.client.post('/bulk/{}/import?format={}{}'.format(
+            kind, fmt, '&keep_ids=1' if keep_ids else ''), data=data.encode('utf-8'))
+        self.assertEqual(res.status_code, 200)
+        return json.loads(res.data)
+
+    def export_data(self, kind, fmt):
+        res = self.client.get('/bulk/{}/export?format={}'.format(kind, fmt))
+        self.assertEqual(res.status_code, 200)
+        return res.get_data(as_text=True)
+
+    def ndjson(self, *rows):
+        return ''.join(json.dumps(row) + '\n' for row in rows)
+
+    def venue(self, **fields):
+        return dict({"name": "The Musical Hop", "city": "San Francisco", "state": "CA",
+                     "address": "1015 Folsom Street", "genres": ["Jazz", "Folk"],
+                     "facebook_link": "https://www.facebook.com/TheMusicalHop"}, **fields)
+
+    def artist(self, **fields):
+        return dict({"name": "Guns N Petals", "city": "San Francisco", "state": "CA",
+                     "genres": ["Rock n Roll"],
+                     "facebook_link": "https://www.facebook.com/GunsNPetals"}, **fields)
+
+    def test_csv_round_trip(self):
+        result = self.import_data('venues', (
+            'name,city,state,address,genres,facebook_link,seeking_talent\n'
+            'The Musical Hop,San Francisco,CA,1015 Folsom Street,Jazz;Folk,'
+            'https://www.facebook.com/TheMusicalHop,y\n'
+            'The Dueling Pianos Bar,New York,NY,335 Delancey Street,Classical,'
+            'https://www.facebook.com/theduelingpianos,\n'), 'csv')
+        self.assertEqual(result, {"inserted": 2, "errors": []})
+        exported = self.export_data('venues', 'csv')
+        self.assertIn('The Musical Hop,San Francisco,CA,1015 Folsom Street', exported)
+        self.assertIn('Jazz;Folk', exported)
+
+        self.clear()
+        self.assertEqual(self.import_data('venues', exported, 'csv', keep_ids=True)["inserted"], 2)
+        self.assertEqual(self.export_data('venues', 'csv'), exported)
+
+    def test_ndjson_round_trip(self):
+        self.import_data('venues', self.ndjson(self.venue()), 'ndjson')
+        self.import_data('artists', self.ndjson(self.artist()), 'ndjson')
+        with app.app_context():
+            venue_id, artist_id = Venue.query.one().id, Artist.query.one().id
+        result = self.import_data('shows', self.ndjson({
+            "venue_id": venue_id, "artist_id": artist_id, "start_time": "2035-04-01T20:00:00+00:00"
+        }), 'ndjson')
+        self.assertEqual(result, {"inserted": 1, "errors": []})
+        exported = {kind: self.export_data(kind, 'ndjson') for kind in ('venues', 'artists', 'shows')}
+        show = json.loads(exported['shows'])
+        self.assertEqual(show["start_time"], "2035-04-01T20:00:00+00:00")
+
+        self.clear()
+        for kind in ('venues', 'artists', 'shows'):
+            self.assertEqual(self.import_data(kind, exported[kind], 'ndjson', keep_ids=True),
+                             {"inserted": 1, "errors": []})
+            self.assertEqual(self.export_data(kind, 'ndjson'), exported[kind])
+
+    def test_rows_the_database_rejects(self):
+        self.import_data('venues', self.ndjson(self.venue()), 'ndjson')
+        self.import_data('artists', self.ndjson(self.artist()), 'ndjson')
+        with app.app_context():
+            venue_id, artist_id = Venue.query.one().id, Artist.query.one().id
+        show = {"venue_id": venue_id, "artist_id": artist_id, "start_time": "2035-04-01 20:00:00"}
+        result = self.import_data('shows', self.ndjson(
+            show, dict(show, venue_id=venue_id + 1000), show), 'ndjson')
+        self.assertEqual(result["inserted"], 2)
+        self.assertEqual([error["line"] for error in result["errors"]], [2])
+        self.assertIn('violates foreign key constraint', result["errors"][0]["errors"]["row"])
+
+    def test_malformed_rows(self):
+        result = self.import_data('venues', ''.join([
+            '{"name": \n',
+            '[1, 2]\n',
+            self.ndjson(
+                self.venue(state=["CA"]),
+                self.venue(state=5),
+                self.venue(genres=[1]),
+                self.venue(genres="Jazz", facebook_link=5),
+                self.venue(name="Venue", phone=5551234),
+            )]), 'ndjson')
+        self.assertEqual(result["inserted"], 1)
+        self.assertEqual(result["errors"], [
+            {"line": 1, "errors": {"row": result["errors"][0]["errors"]["row"]}},
+            {"line": 2, "errors": {"row": "Not a JSON object"}},
+            {"line": 3, "errors": {"state": "Not a valid string"}},
+            {"line": 4, "errors": {"state": "Not a valid choice: 5"}},
+            {"line": 5, "errors": {"genres": "Not a valid list of strings"}},
+            {"line": 6, "errors": {"facebook_link": "Invalid URL."}},
+        ])
+        self.assertTrue(result["errors"][0]["errors"]["row"].startswith('Invalid JSON'))
+        with app.app_context():
+            self.assertEqual(Venue.query.one().phone, '5551234')
+
+        result = self.import_data('shows', self.ndjson(
+            {"venue_id": 1, "artist_id": 1, "start_time": 20200101}), 'ndjson')
+        self.assertEqual(result["errors"], [
+            {"line": 1, "errors": {"start_time": "Not a valid datetime value"}}])
+
+
+class ReplicaTestCase(unittest.TestCase):
+    """Routing of the read-only views to REPLICA_URIS (replicas.py).
+
+    The app is started without replicas, the router is bound here to the
+    second postgres database of TEST_REPLICA_DATABASE_URL. Venue 1 has a
+    different name on each side, so a page shows where it was read from.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        app.config['WTF_CSRF_ENABLED'] = False
+        cls.bind_replica(REPLICA_DATABASE_URL)
+        with app.app_context():
+            try:
+                db.drop_all()
+                db.Model.metadata.drop_all(cls.replica_engine())
+            except OperationalError as e:
+                cls.unbind_replica()
+                raise unittest.SkipTest('no test database: {}'.format(e.orig))
+            db.create_all()
+            db.Model.metadata.create_all(cls.replica_engine())
+            db.session.add(Venue(id=1, name='Primary venue', city='Austin', state='TX',
+                                 genres=['Jazz']))
+            db.session.commit()
+            with cls.replica_engine().begin() as connection:
+                connection.execute(Venue.__table__.insert(), id=1, name='Replica venue',
+                                   city='Austin', state='TX', genres=['Jazz'])
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.Model.metadata.drop_all(cls.replica_engine())
+        cls.unbind_replica()
+
+    @classmethod
+    def bind_replica(cls, uri):
+        # what ReplicaRouter.init_app does for REPLICA_URIS = [uri]
+        cls.unbind_replica()
+        app.config['SQLALCHEMY_BINDS'] = {'replica_0': uri}
+        replicas.binds = ['replica_0']
+
+    @classmethod
+    def unbind_replica(cls):
+        connector = get_state(app).connectors.pop('replica_0', None)
+        if connector is not None and connector._engine is not None:
+            connector._engine.dispose()
+        app.config['SQLALCHEMY_BINDS'] = {}
+        replicas.binds = []
+        replicas._health.clear()
+
+    @classmethod
+    def replica_engine(cls):
+        return db.get_engine(app, bind='replica_0')
+
+    def setUp(self):
+        self.client = app.test_client()
+        replicas._health.clear()
+
+    def read(self, path):
+        # (page, statements run on the primary, statements run on the replica)
+        with app.app_context():
+            with count_queries(db.engine) as primary, \
+                    count_queries(self.replica_engine()) as replica:
+                res = self.client.get(path)
+        self.assertEqual(res.status_code, 200)
+        return res.get_data(as_text=True), primary.count, replica.count
+
+    def assert_read_from(self, side, path='/venues/1'):
+        page, primary, replica = self.read(path)
+        if side == 'replica':
+            self.assertIn('Replica venue', page)
+            self.assertEqual(primary, 0)
+            self.assertGreater(replica, 0)
+        else:
+            self.assertIn('Primary venue', page)
+            self.assertGreater(primary, 0)
+            self.assertNotIn('Replica venue', page)
+
+    def test_read_only_views_use_the_replica(self):
+        self.assert_read_from('replica')
+        self.assert_read_from('replica', '/venues')
+
+    def test_health_is_checked_once_per_interval(self):
+        _, _, checked = self.read('/venues/1')
+        _, _, unchecked = self.read('/venues/1')
+        self.assertEqual(checked, unchecked + 1)
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        self.assert_read_from('replica')
+        with app.app_context():
+            db.session.add(Venue(id=2, name='Venue to delete', city='Austin', state='TX'))
+            db.session.commit()
+        res = self.client.delete('/venues/2')
+        self.assertEqual(res.status_code, 303)
+        self.assertIn(STICKY_COOKIE, res.headers['Set-Cookie'])
+        self.assert_read_from('primary')
+        # reads do not extend the stickiness
+        self.assertNotIn('Set-Cookie', self.client.get('/venues/1').headers)
+
+        # past REPLICA_STICKY_SECONDS
+        self.client.set_cookie('localhost', STICKY_COOKIE, '0')
+        self.assert_read_from('replica')
+
+    def test_lagging_replica_falls_back_to_the_primary(self):
+        max_lag = replicas.max_lag
+        # any lag at all is too much
+        replicas.max_lag = -1
+        try:
+            self.assert_read_from('primary')
+        finally:
+            replicas.max_lag = max_lag
+        # the last check is kept for REPLICA_CHECK_INTERVAL
+        self.assert_read_from('primary')
+        replicas._health.clear()
+        self.assert_read_from('replica')
+
+    def test_unavailable_replica_falls_back_to_the_primary(self):
+        # nothing listens on port 1
+        self.bind_replica('postgresql://localhost:1/fyyur_test_replica')
+        try:
+            with self.assertLogs(app.logger, 'ERROR'):
+                page, primary, _ = self.read('/venues/1')
+            self.assertIn('Primary venue', page)
+            self.assertGreater(primary, 0)
+        finally:
+            self.bind_replica(REPLICA_DATABASE_URL)
+
+
+class FormatDatetimeTestCase(unittest.TestCase):
+    """The datetime filter of the templates."""
+
+    def test_named_formats(self):
+        start_time = datetime(2019, 5, 21, 21, 30, tzinfo=timezone.utc)
+        self.assertEqual(format_datetime(start_time, 'full', 'en_US'),
+                         'Tuesday May, 21, 2019 at 9:30PM')
+        # names without an override are babel's own formats
+        for name in ('long', 'short'):
+            self.assertEqual(format_datetime(start_time, name, 'en_US'),
+                             babel.dates.format_datetime(start_time, name, locale='en_US'))
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -1,19 +1,72 @@
 import os
-from flask import Flask, request, abort, jsonify
+from flask import Flask, request, abort, Response
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from sqlalchemy import event
+from itertools import chain
 import random
+import time
+from array import array
 
-from models import setup_db, Question, Category
+from models import (db, setup_db, create_search_index, Question, Category,
+                    question_rows, category_rows, question_dict, category_dict)
+from .cache import CategoryCache
+from .search import search_questions
+from .instrumentation import Instrumentation
+from .fast_json import FastJSON, jsonify, stream_json
 
 QUESTIONS_PER_PAGE = 10
+MAX_QUESTIONS_PER_PAGE = 100
+QUESTION_COUNT_TTL = 30
+MAX_BATCH_SIZE = 10000
+
+# Category cache invalidation. A transaction that writes categories through
+# the ORM is noted in session.info, and the cache of the session's app is
+# invalidated once it commits: invalidating at flush time would let another
+# request cache the rows of the uncommitted transaction. The listeners are
+# registered once, on the session class that every app shares.
+CATEGORIES_CHANGED = 'categories_changed'
+
+
+@event.listens_for(db.session, 'before_flush')
+def _note_category_writes(session, flush_context, instances):
+    if any(isinstance(instance, Category) for instance in
+           chain(session.new, session.dirty, session.deleted)):
+        session.info[CATEGORIES_CHANGED] = True
+
+
+@event.listens_for(db.session, 'after_bulk_update')
+@event.listens_for(db.session, 'after_bulk_delete')
+def _note_category_bulk_writes(update_context):
+    if update_context.mapper.class_ is Category:
+        update_context.session.info[CATEGORIES_CHANGED] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_category_cache(session):
+    if session.info.pop(CATEGORIES_CHANGED, False):
+        category_cache = getattr(session.app, 'category_cache', None)
+        if category_cache is not None:
+            category_cache.invalidate()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_category_writes(session):
+    session.info.pop(CATEGORIES_CHANGED, None)
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
+    app.config.from_mapping(
+        QUESTIONS_PER_PAGE=QUESTIONS_PER_PAGE,
+        QUESTION_COUNT_TTL=QUESTION_COUNT_TTL)
+    if test_config is not None:
+        app.config.from_mapping(test_config)
     db = setup_db(app)
     CORS(app)
+    Instrumentation(app)
+    FastJSON(app)
 
     @app.after_request
     def after_request_response(response):
@@ -23,31 +76,75 @@ def create_app(test_config=None):
         response.headers.add('Access-Control-Allow-Methods', 'GET, POST')
         return response
 
+    def _load_categories():
+        rows = db.session.execute(category_rows())
+        return [category_dict(row) for row in rows]
+
+    # categories almost never change: keep them in memory (or in the
+    # CATEGORY_CACHE_BACKEND shared by all workers) until a committed write
+    # to the categories table invalidates them, see _invalidate_category_cache
+    category_cache = CategoryCache(
+        _load_categories, backend=app.config.get("CATEGORY_CACHE_BACKEND"))
+    app.category_cache = category_cache
+
     def _get_all_categories():
-        categories = Category.query.all()
-        formatted_categories = [category.format() for category in categories]
-        return formatted_categories
+        return category_cache.formatted
 
     @app.route('/categories', methods=['GET'])
     def get_all_categories():
-        formatted_categories = _get_all_categories()
-        return jsonify({
-            "categories": formatted_categories,
-            "success": True
-        })
+        etag = category_cache.etag
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = jsonify({
+                "categories": _get_all_categories(),
+                "success": True
+            })
+        response.set_etag(etag)
+        return response
+
+    question_count = {"value": None, "expires": 0}
+    # sorted question ids per category (0 for all of them) for the quiz,
+    # kept like the count and dropped along with it on every write
+    quiz_ids = {}
+
+    def _get_question_count():
+        # the total only drives the pager, so a slightly stale value is
+        # fine and saves a count(*) over the whole table on every page
+        now = time.monotonic()
+        if question_count["value"] is None or question_count["expires"] <= now:
+            question_count["value"] = Question.query.count()
+            question_count["expires"] = now + app.config["QUESTION_COUNT_TTL"]
+        return question_count["value"]
+
+    def _invalidate_question_caches():
+        question_count["value"] = None
+        quiz_ids.clear()
+
+    def _paginate_questions(query):
+        # the page window is applied in SQL, either keyset (?after_id=)
+        # or LIMIT/OFFSET (?page=), always ordered by question id
+        per_page = request.args.get(
+            'per_page', app.config["QUESTIONS_PER_PAGE"], type=int)
+        per_page = max(1, min(per_page, MAX_QUESTIONS_PER_PAGE))
+        after_id = request.args.get('after_id', type=int)
+        query = query.order_by(Question.id)
+        if after_id is not None:
+            query = query.where(Question.id > after_id)
+        else:
+            page = max(request.args.get('page', 1, type=int), 1)
+            query = query.offset((page - 1) * per_page)
+        return db.session.execute(query.limit(per_page))
 
     @app.route('/questions')
     def get_all_questions():
-        questions = Question.query.all()
+        rows = _paginate_questions(question_rows())
+        formatted_questions = [question_dict(row) for row in rows]
         formatted_categories = _get_all_categories()
-        page = request.args.get('page')
-        page = 1 if page is None else int(page)
-        start = (page - 1) * 10
-        end = start + 10
-        formatted_questions = [question.format() for question in questions]
         return jsonify({
-            "questions": formatted_questions[start: end],
-            "total_questions": len(formatted_questions),
+            "questions": formatted_questions,
+            "total_questions": _get_question_count(),
+            "last_id": formatted_questions[-1]["id"] if formatted_questions else None,
             "categories": formatted_categories,
             "current_category": "Sports",
             "success": True
@@ -58,8 +155,9 @@ def create_app(test_config=None):
         try:
             Question.query.filter_by(id=question_id).delete()
             db.session.commit()
-        except Exception as e:
-            print(e)
+            _invalidate_question_caches()
+        except Exception:
+            app.logger.exception('could not delete question %s', question_id)
             db.session.rollback()
             db.session.close()
             abort(500)
@@ -83,6 +181,7 @@ def create_app(test_config=None):
             db.session.add(question)
             db.session.commit()
             id = question.id
+            _invalidate_question_caches()
         except KeyError as e:
             db.session.close()
             abort(400)
@@ -97,62 +196,183 @@ def create_app(test_config=None):
             "success": True
         })
 
+    def _validate_question(item):
+        if not isinstance(item, dict):
+            return None, "question must be an object"
+        missing = [key for key in ("question", "answer", "category", "difficulty")
+                   if item.get(key) in (None, "")]
+        if missing:
+            return None, "missing {}".format(", ".join(missing))
+        try:
+            difficulty = int(item["difficulty"])
+        except (TypeError, ValueError):
+            return None, "difficulty must be an integer"
+        return {
+            "question": item["question"],
+            "answer": item["answer"],
+            "category": str(item["category"]),
+            "difficulty": difficulty
+        }, None
+
+    def _get_batch(body, key):
+        if not isinstance(body, dict) or not isinstance(body.get(key), list):
+            abort(400)
+        if len(body[key]) > MAX_BATCH_SIZE:
+            abort(422)
+        return body[key]
+
+    @app.route('/questions/batch', methods=['POST'])
+    def create_questions_batch():
+        items = _get_batch(request.get_json(silent=True), "questions")
+        rows = []
+        errors = []
+        for index, item in enumerate(items):
+            row, error = _validate_question(item)
+            if error:
+                errors.append({"index": index, "message": error})
+            else:
+                rows.append(row)
+        try:
+            if rows:
+                # a single multi-row insert in one transaction
+                db.session.execute(Question.__table__.insert(), rows)
+                db.session.commit()
+                _invalidate_question_caches()
+        except Exception:
+            app.logger.exception('could not insert a batch of %s questions', len(rows))
+            db.session.rollback()
+            abort(500)
+        finally:
+            db.session.close()
+        return jsonify({
+            "inserted": len(rows),
+            "errors": errors,
+            "message": "Added",
+            "success": True
+        })
+
+    @app.route('/questions/batch', methods=['DELETE'])
+    def delete_questions_batch():
+        items = _get_batch(request.get_json(silent=True), "ids")
+        # (index, id) of the items that are ids, the others are reported
+        valid = []
+        errors = []
+        for index, item in enumerate(items):
+            if isinstance(item, int) and not isinstance(item, bool):
+                valid.append((index, item))
+            else:
+                errors.append({"index": index, "message": "id must be an integer"})
+        ids = {id for _, id in valid}
+        try:
+            found = set()
+            if ids:
+                found = {id for id, in db.session.query(Question.id).
+                         filter(Question.id.in_(ids))}
+                Question.query.filter(Question.id.in_(found)).\
+                    delete(synchronize_session=False)
+                db.session.commit()
+                _invalidate_question_caches()
+        except Exception:
+            app.logger.exception('could not delete a batch of %s questions', len(ids))
+            db.session.rollback()
+            abort(500)
+        finally:
+            db.session.close()
+        errors.extend({"index": index, "message": "question not found"}
+                      for index, id in valid if id not in found)
+        errors.sort(key=lambda error: error["index"])
+        return jsonify({
+            "deleted": len(found),
+            "errors": errors,
+            "message": "Deleted",
+            "success": True
+        })
+
     @app.route('/search', methods=['POST'])
     def search_question():
         try:
             body = request.get_json()
-            search_term = "%{}%".format(body["searchTerm"])
-            questions = Question.query.filter(
-                Question.question.ilike(search_term)).all()
-            formatted_questions = [question.format() for question in questions]
-            return jsonify({
-                "questions": formatted_questions,
-                "total_questions": len(formatted_questions),
-                "current_category": "Sports"
-            })
-        except (TypeError, ValueError, KeyError) as e:
+            search_term = str(body["searchTerm"])
+            category = body.get("category")
+            category = None if category in (None, 0, "0", "") else int(category)
+            page = max(int(body.get("page", 1)), 1)
+        except (TypeError, ValueError, KeyError, AttributeError) as e:
             abort(400)
-
-    @app.route('/categories/<int:category_id>/questions')
-    def get_question_by_category(category_id):
-        questions = Question.query.filter_by(category=category_id).all()
-        formatted_questions = [question.format() for question in questions]
-        formatted_categories = _get_all_categories()
+        questions, total = search_questions(
+            db.session, search_term, category=category, page=page,
+            per_page=app.config["QUESTIONS_PER_PAGE"])
         return jsonify({
-            "questions": formatted_questions,
-            "totalQuestions": len(formatted_questions),
-            "currentCategory": category_id,
+            "questions": questions,
+            "total_questions": total,
+            "current_category": category,
             "success": True
         })
 
+    @app.route('/categories/<int:category_id>/questions')
+    def get_question_by_category(category_id):
+        # a category can hold any number of questions: the list is
+        # encoded and sent as the rows come in, the total comes last
+        rows = db.session.execute(question_rows().
+                                  where(Question.category == str(category_id)).
+                                  order_by(Question.id))
+        return stream_json(
+            {"currentCategory": category_id},
+            "questions", (question_dict(row) for row in rows),
+            lambda count: {"success": True, "totalQuestions": count})
+
+    # seeded through QUIZ_RANDOM_SEED so tests get a repeatable quiz
+    quiz_random = random.Random(app.config.get("QUIZ_RANDOM_SEED"))
+
+    def _get_quiz_ids(category_id):
+        if category_id != 0 and category_id not in category_cache.types:
+            return array('q')
+        now = time.monotonic()
+        entry = quiz_ids.get(category_id)
+        if entry is None or entry["expires"] <= now:
+            query = db.session.query(Question.id)
+            if category_id != 0:
+                query = query.filter_by(category=str(category_id))
+            entry = quiz_ids[category_id] = {
+                "ids": array('q', (id for id, in query.order_by(Question.id))),
+                "expires": now + app.config["QUESTION_COUNT_TTL"]
+            }
+        return entry["ids"]
+
+    def _pick_question_id(ids, excluded):
+        # uniformly among the ids not in excluded, None when there are none.
+        # while fewer than half are excluded, random draws find one in under
+        # two tries on average; past that the remaining ids are listed
+        if len(excluded) * 2 < len(ids):
+            while True:
+                question_id = ids[quiz_random.randrange(len(ids))]
+                if question_id not in excluded:
+                    return question_id
+        remaining = [question_id for question_id in ids if question_id not in excluded]
+        return quiz_random.choice(remaining) if remaining else None
+
     @app.route('/quizzes', methods=['POST'])
     def play():
         try:
             body = request.get_json()
-            if body["quiz_category"]["id"] == 0:
-                questions = Question.query.all()
-            else:
-                questions = Question.query.filter_by(
-                    category=body["quiz_category"]["id"]).all()
-            previous_questions = body["previous_questions"]
-            total_questions_in_category = len(questions)
-            random_question_id = None
-            while True:
-                if len(previous_questions) == total_questions_in_category:
-                    break
-                random_question_id = random.randint(
-                    0, total_questions_in_category - 1)
-                if questions[random_question_id].id not in previous_questions:
-                    break
-
-            if random_question_id is not None:
+            category_id = int(body["quiz_category"]["id"])
+            previous_questions = [int(id) for id in body["previous_questions"]]
+        except (TypeError, ValueError, KeyError) as e:
+            app.logger.info('bad quiz request: %r', e)
+            abort(400)
+
+        excluded = set(previous_questions)
+        for attempt in range(2):
+            question_id = _pick_question_id(_get_quiz_ids(category_id), excluded)
+            if question_id is None:
+                return jsonify({})
+            question = Question.query.get(question_id)
+            if question is not None:
                 return jsonify({
-                    "question": questions[random_question_id].format()
+                    "question": question.format()
                 })
-            return jsonify({})
-        except KeyError as e:
-            print(e)
-            abort(400)
+            # deleted since the ids were cached, e.g. by another worker
+            quiz_ids.pop(category_id, None)
+        return jsonify({})
 
     @app.errorhandler(500)
     def server_error(error):
@@ -194,4 +414,9 @@ def create_app(test_config=None):
             "message": "Method not allowed. Please check documentation"
         }), 405
 
+    @app.cli.command('create-search-index')
+    def create_search_index_command():
+        """Build the full-text index of POST /search (postgres, once)."""
+        create_search_index()
+
     return app
@@ -0,0 +1,70 @@
+import hashlib
+import json
+import threading
+import time
+
+
+class CategoryCache:
+    """
+    Process level cache of the categories table.
+
+    Keeps the preformatted category list, an id -> type map and an ETag
+    for the encoded list. `loader` is called to (re)build the list, e.g.
+    after `invalidate()`. An optional shared `backend` (any object with
+    get/set/delete, such as a redis client) lets several workers share one
+    copy; each worker then only keeps its local copy for `local_ttl`
+    seconds so an invalidation in one worker reaches the others.
+    """
+
+    KEY = 'trivia:categories'
+
+    def __init__(self, loader, backend=None, local_ttl=5):
+        self.loader = loader
+        self.backend = backend
+        self.local_ttl = local_ttl
+        self._lock = threading.Lock()
+        self._entry = None
+        self._expires = None
+
+    @property
+    def formatted(self):
+        return self._get()["formatted"]
+
+    @property
+    def types(self):
+        return self._get()["types"]
+
+    @property
+    def etag(self):
+        return self._get()["etag"]
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+            if self.backend is not None:
+                self.backend.delete(self.KEY)
+
+    def _get(self):
+        entry, expires = self._entry, self._expires
+        if entry is not None and (expires is None or expires > time.monotonic()):
+            return entry
+        with self._lock:
+            encoded = None
+            if self.backend is not None:
+                encoded = self.backend.get(self.KEY)
+            if encoded is None:
+                encoded = json.dumps(self.loader())
+                if self.backend is not None:
+                    self.backend.set(self.KEY, encoded)
+            if isinstance(encoded, bytes):
+                encoded = encoded.decode('utf-8')
+            formatted = json.loads(encoded)
+            self._expires = (None if self.backend is None
+                             else time.monotonic() + self.local_ttl)
+            self._entry = {
+                "formatted": formatted,
+                "types": {category["id"]: category["type"]
+                          for category in formatted},
+                "etag": hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+            }
+            return self._entry
@@ -0,0 +1,227 @@
+import bisect
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, current_app, g, has_app_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-request SQL and latency instrumentation.
+#
+#     instrumentation = Instrumentation(app)
+#
+# Every request gets its query count, time spent in the database, time
+# spent rendering templates and total latency recorded per endpoint. The
+# totals are served in the Prometheus text format at METRICS_PATH, queries
+# slower than SLOW_QUERY_MS are logged with their parameters and requests
+# slower than SLOW_REQUEST_MS with their query count, which is where N+1
+# patterns show up.
+#
+# Latency is measured up to after_request, so the body of a streamed
+# response is not included. Set METRICS_PATH to None to serve the metrics
+# elsewhere, through metrics(). Any app extension with a metric_lines()
+# method is listed as well.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+MAX_LOGGED_PARAMETERS = 1000
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield '{}_bucket{} {}'.format(
+                name, _labels(labels, le=bound), cumulative)
+        yield '{}_sum{} {}'.format(name, _labels(labels), self.sum)
+        yield '{}_count{} {}'.format(name, _labels(labels), self.count)
+
+
+class _RequestStats:
+    __slots__ = ('started', 'queries', 'db_time', 'render_time', 'slow_queries')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.slow_queries = 0
+
+
+class _TimedTemplate(Template):
+    # adds the time spent in render_template to the current request
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            stats = _current_stats()
+            if stats is not None:
+                stats.render_time += time.perf_counter() - started
+
+
+def _current_stats():
+    if not has_app_context():
+        return None
+    return g.get('_request_stats')
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(key, str(value).replace('"', '\\"'))
+                          for key, value in pairs) + '}'
+
+
+_engine_listeners = threading.Lock()
+_listening = False
+
+
+def _listen_to_engines():
+    # once per process: the statements of every engine are charged to the
+    # request being served, if any
+    global _listening
+    with _engine_listeners:
+        if _listening:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _listening = True
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats() is not None:
+        conn.info.setdefault('_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('_query_started')
+    stats = _current_stats()
+    if not started or stats is None:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    stats.queries += 1
+    stats.db_time += elapsed
+    instrumentation = g.get('_instrumentation')
+    if instrumentation is not None and elapsed * 1000 >= instrumentation.slow_query_ms:
+        stats.slow_queries += 1
+        instrumentation.logger.warning(
+            'slow query (%.1f ms) in %s: %s parameters=%s',
+            elapsed * 1000, request.endpoint, statement,
+            repr(parameters)[:MAX_LOGGED_PARAMETERS])
+
+
+def _handle_error(context):
+    started = context.connection.info.get('_query_started') if context.connection else None
+    if started:
+        started.pop()
+
+
+class Instrumentation:
+    def __init__(self, app=None):
+        self.slow_query_ms = 100
+        self.slow_request_ms = 500
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)
+        self._latency = defaultdict(lambda: _Histogram(LATENCY_BUCKETS))
+        self._query_counts = defaultdict(lambda: _Histogram(QUERY_COUNT_BUCKETS))
+        self._db_time = defaultdict(float)
+        self._render_time = defaultdict(float)
+        self._slow_queries = defaultdict(int)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.slow_query_ms = app.config.get('SLOW_QUERY_MS', self.slow_query_ms)
+        self.slow_request_ms = app.config.get('SLOW_REQUEST_MS', self.slow_request_ms)
+        self.logger = app.logger
+        self.metrics_path = app.config.get('METRICS_PATH', '/metrics')
+        app.jinja_env.template_class = _TimedTemplate
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if self.metrics_path:
+            app.add_url_rule(self.metrics_path, 'metrics', self.metrics)
+        app.extensions['instrumentation'] = self
+        _listen_to_engines()
+
+    def _before_request(self):
+        if request.path == self.metrics_path:
+            return
+        g._request_stats = _RequestStats()
+        g._instrumentation = self
+
+    def _after_request(self, response):
+        stats = g.pop('_request_stats', None)
+        g.pop('_instrumentation', None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        endpoint = request.endpoint or 'unmatched'
+        with self._lock:
+            self._requests[(endpoint, request.method, response.status_code)] += 1
+            self._latency[endpoint].observe(elapsed)
+            self._query_counts[endpoint].observe(stats.queries)
+            self._db_time[endpoint] += stats.db_time
+            self._render_time[endpoint] += stats.render_time
+            self._slow_queries[endpoint] += stats.slow_queries
+        if elapsed * 1000 >= self.slow_request_ms:
+            self.logger.warning(
+                'slow request (%.1f ms) %s %s: %d queries, %.1f ms in the '
+                'database, %.1f ms rendering', elapsed * 1000, request.method,
+                request.full_path, stats.queries, stats.db_time * 1000,
+                stats.render_time * 1000)
+        return response
+
+    def metrics(self):
+        with self._lock:
+            lines = list(self._metric_lines())
+        # other extensions, such as the connection pool, add their own
+        for extension in current_app.extensions.values():
+            if hasattr(extension, 'metric_lines'):
+                lines.extend(extension.metric_lines())
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+    def _metric_lines(self):
+        yield '# HELP http_requests_total Requests served.'
+        yield '# TYPE http_requests_total counter'
+        for (endpoint, method, status), count in sorted(self._requests.items()):
+            yield 'http_requests_total{} {}'.format(_labels(
+                [('endpoint', endpoint), ('method', method), ('status', status)]), count)
+        yield '# HELP http_request_duration_seconds Request latency up to after_request.'
+        yield '# TYPE http_request_duration_seconds histogram'
+        for endpoint, histogram in sorted(self._latency.items()):
+            yield from histogram.lines('http_request_duration_seconds',
+                                       [('endpoint', endpoint)])
+        yield '# HELP db_queries_per_request SQL statements executed per request.'
+        yield '# TYPE db_queries_per_request histogram'
+        for endpoint, histogram in sorted(self._query_counts.items()):
+            yield from histogram.lines('db_queries_per_request',
+                                       [('endpoint', endpoint)])
+        for name, help, values in (
+                ('db_query_seconds_total', 'Time spent executing SQL.', self._db_time),
+                ('template_render_seconds_total', 'Time spent rendering templates.',
+                 self._render_time),
+                ('db_slow_queries_total', 'Queries slower than SLOW_QUERY_MS.',
+                 self._slow_queries)):
+            yield '# HELP {} {}'.format(name, help)
+            yield '# TYPE {} counter'.format(name)
+            for endpoint, value in sorted(values.items()):
+                yield '{}{} {}'.format(name, _labels([('endpoint', endpoint)]), value)
@@ -0,0 +1,70 @@
+import re
+from sqlalchemy import func, select, text
+
+from models import Question, question_dict
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def search_questions(session, term, category=None, page=1, per_page=10):
+    """
+    Ranked full-text search over question and answer.
+
+    Every word of `term` is matched as a prefix ("auto" finds
+    "autobiography"). On postgres the query repeats the to_tsvector
+    expression of the ix_questions_fts GIN index, so the index serves it
+    once built with `flask create-search-index`; on sqlite it goes through
+    the questions_fts FTS5 table created by models.setup_search_index().
+    Returns the formatted page of questions and the total number of
+    matches, both from a single query.
+    """
+    words = WORD.findall(term)
+    offset = (page - 1) * per_page
+    if session.bind.dialect.name == 'sqlite':
+        rows = _sqlite_search(session, words, category, per_page, offset)
+    else:
+        rows = _postgres_search(session, words, category, per_page, offset)
+    total = rows[0].total if rows else 0
+    questions = [question_dict(row) for row in rows]
+    return questions, total
+
+
+def _postgres_search(session, words, category, limit, offset):
+    table = Question.__table__
+    query = select([table, func.count().over().label('total')])
+    if words:
+        document = func.to_tsvector(
+            'english',
+            func.coalesce(table.c.question, '') + ' ' +
+            func.coalesce(table.c.answer, ''))
+        tsquery = func.to_tsquery(
+            'english', ' & '.join(word + ':*' for word in words))
+        query = query.where(document.op('@@')(tsquery)).\
+            order_by(func.ts_rank(document, tsquery).desc(), table.c.id)
+    else:
+        query = query.order_by(table.c.id)
+    if category is not None:
+        query = query.where(table.c.category == str(category))
+    return session.execute(query.limit(limit).offset(offset)).fetchall()
+
+
+def _sqlite_search(session, words, category, limit, offset):
+    params = {'limit': limit, 'offset': offset}
+    if words:
+        # quoted so that FTS5 operators in user input are matched literally
+        params['match'] = ' '.join(
+            '"{}"*'.format(word.replace('"', '""')) for word in words)
+        source = ('questions_fts f JOIN questions q ON q.id = f.rowid '
+                  'WHERE questions_fts MATCH :match')
+        order = 'f.rank, q.id'
+    else:
+        source = 'questions q WHERE 1 = 1'
+        order = 'q.id'
+    if category is not None:
+        params['category'] = str(category)
+        source += ' AND q.category = :category'
+    query = text(
+        'SELECT q.id, q.question, q.answer, q.category, q.difficulty, '
+        'count(*) OVER () AS total FROM ' + source +
+        ' ORDER BY ' + order + ' LIMIT :limit OFFSET :offset')
+    return session.execute(query, params).fetchall()
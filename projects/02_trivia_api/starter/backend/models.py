@@ -1,25 +1,120 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, create_engine, select, text
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from db_pool import engine_options, setup_pool
+
 database_name = "trivia"
-database_path = "postgres://{}/{}".format('localhost:5432', database_name)
+database_path = os.environ.get(
+    "DATABASE_URL", "postgresql://{}/{}".format('localhost:5432', database_name))
 
 db = SQLAlchemy()
 
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    the connection pool is configured from the DB_* settings, see db_pool.py
 '''
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path, app.config)
     db.app = app
     db.init_app(app)
     db.create_all()
+    setup_search_index()
+    setup_pool(app, db.engine)
     return db
 
+'''
+setup_search_index()
+    sqlite: creates the questions_fts FTS5 table used by POST /search, kept
+    in sync with triggers, and indexes the existing rows when the table was
+    just created
+    postgres: nothing, the GIN index is built once with create_search_index()
+    (flask create-search-index), not on every start
+'''
+def setup_search_index():
+    if db.engine.dialect.name != 'sqlite':
+        return
+    statements = [
+        """CREATE TRIGGER IF NOT EXISTS questions_fts_ai AFTER INSERT ON questions BEGIN
+             INSERT INTO questions_fts(rowid, question, answer)
+             VALUES (new.id, new.question, new.answer);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS questions_fts_ad AFTER DELETE ON questions BEGIN
+             INSERT INTO questions_fts(questions_fts, rowid, question, answer)
+             VALUES ('delete', old.id, old.question, old.answer);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS questions_fts_au AFTER UPDATE ON questions BEGIN
+             INSERT INTO questions_fts(questions_fts, rowid, question, answer)
+             VALUES ('delete', old.id, old.question, old.answer);
+             INSERT INTO questions_fts(rowid, question, answer)
+             VALUES (new.id, new.question, new.answer);
+           END"""
+    ]
+    with db.engine.begin() as connection:
+        created = not connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'questions_fts'"
+        )).scalar()
+        if created:
+            connection.execute(text(
+                """CREATE VIRTUAL TABLE questions_fts
+                   USING fts5(question, answer, content='questions', content_rowid='id')"""))
+        for statement in statements:
+            connection.execute(text(statement))
+        if created:
+            connection.execute(text(
+                "INSERT INTO questions_fts(questions_fts) VALUES ('rebuild')"))
+
+'''
+create_search_index()
+    one-off setup step on postgres: builds the GIN index on the question +
+    answer tsvector that POST /search uses, if missing. CONCURRENTLY, so
+    the questions table stays writable while it is built; it cannot run
+    inside a transaction, hence the autocommit connection
+    search works without the index, scanning the whole table
+'''
+def create_search_index():
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.connect() as connection:
+        connection.execution_options(isolation_level='AUTOCOMMIT').execute(text(
+            """CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_questions_fts ON questions
+               USING gin (to_tsvector('english',
+                 coalesce(question, '') || ' ' || coalesce(answer, '')))"""))
+
+'''
+Read models
+    the list endpoints select plain Core rows instead of loading Question
+    and Category instances: nothing is added to the session's identity map
+    and each row becomes its JSON dict with a single zip
+    question_rows()/category_rows() return selects whose columns are
+    QUESTION_FIELDS/CATEGORY_FIELDS in order, the *_dict() helpers accept
+    any row starting with those columns
+'''
+QUESTION_FIELDS = ('id', 'question', 'answer', 'category', 'difficulty')
+CATEGORY_FIELDS = ('id', 'type')
+
+
+def question_rows():
+    table = Question.__table__
+    return select([table.c[name] for name in QUESTION_FIELDS])
+
+
+def category_rows():
+    table = Category.__table__
+    return select([table.c[name] for name in CATEGORY_FIELDS]).order_by(table.c.id)
+
+
+def question_dict(row):
+    return dict(zip(QUESTION_FIELDS, row))
+
+
+def category_dict(row):
+    return dict(zip(CATEGORY_FIELDS, row))
+
 '''
 Question
 
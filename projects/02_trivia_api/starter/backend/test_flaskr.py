@@ -15,7 +15,7 @@ class TriviaTestCase(unittest.TestCase):
         self.app = create_app()
         self.client = self.app.test_client()
         self.database_name = "trivia_test"
-        self.database_path = "postgres://{}/{}".format('localhost:5432', self.database_name)
+        self.database_path = "postgresql://{}/{}".format('localhost:5432', self.database_name)
         setup_db(self.app, self.database_path)
 
         # binds the app to the current context
@@ -68,6 +68,18 @@ class TriviaTestCase(unittest.TestCase):
         body = json.loads(res.data)
         self.assertEqual(body, expected_response)
 
+    def test_get_all_category_not_modified(self):
+        """
+        Test that GET /categories sends an ETag and answers 304 when it is sent back
+        """
+        res = self.client.get('/categories')
+        self.assertEqual(res.status_code, 200)
+        etag = res.headers.get('ETag')
+        self.assertIsNotNone(etag)
+        res = self.client.get('/categories', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
     def test_get_questions(self):
         """
         Test the GET /questions API endpoint which is expected to be paginated at 10 questions / page
@@ -87,10 +99,28 @@ class TriviaTestCase(unittest.TestCase):
         res = self.client.get('/questions?page=1')
         self.assertEqual(res.status_code, 200)
         body = json.loads(res.data)
-        self.assertEqual(body["questions"][0]["answer"], expected_response["questions"][0]["answer"])
-        self.assertEqual(body["questions"][0]["category"], expected_response["questions"][0]["category"])
-        self.assertEqual(body["questions"][0]["id"], expected_response["questions"][0]["id"])
-        self.assertEqual(body["questions"][0]["question"], expected_response["questions"][0]["question"])
+        # pages are in id order, the expected question is not the first one
+        question = next(q for q in body["questions"] if q["id"] == expected_response["questions"][0]["id"])
+        self.assertEqual(question["answer"], expected_response["questions"][0]["answer"])
+        self.assertEqual(question["category"], expected_response["questions"][0]["category"])
+        self.assertEqual(question["id"], expected_response["questions"][0]["id"])
+        self.assertEqual(question["question"], expected_response["questions"][0]["question"])
+
+    def test_get_questions_page_size(self):
+        """
+        Test that GET /questions pages in SQL: page size, keyset continuation and total count
+        """
+        res = self.client.get('/questions?page=1&per_page=3')
+        self.assertEqual(res.status_code, 200)
+        body = json.loads(res.data)
+        self.assertEqual(len(body["questions"]), 3)
+        self.assertEqual(body["last_id"], body["questions"][-1]["id"])
+        self.assertGreater(body["total_questions"], 3)
+        res = self.client.get(f'/questions?after_id={body["last_id"]}&per_page=3')
+        next_body = json.loads(res.data)
+        self.assertGreater(next_body["questions"][0]["id"], body["last_id"])
+        res = self.client.get('/questions?page=2&per_page=3')
+        self.assertEqual(json.loads(res.data)["questions"], next_body["questions"])
 
     def test_get_question_by_category(self):
         """
@@ -145,6 +175,80 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(body, expected_response) 
 
 
+    def test_play_quiz_uniform(self):
+        """
+        Test that POST /quizzes picks evenly among the remaining questions, whatever their ids
+        """
+        headers = {
+            'Content-Type': 'application/json'
+        }
+        with self.app.app_context():
+            ids = [question.id for question in Question.query.order_by(Question.id)]
+        self.assertGreater(len(ids), 2)
+        # the lowest and the highest id left, with every id between them played
+        body = {"previous_questions": ids[1:-1], "quiz_category": {"type": "click", "id": 0}}
+        picked = {ids[0]: 0, ids[-1]: 0}
+        for _ in range(200):
+            res = self.client.post('/quizzes', data=json.dumps(body), headers=headers)
+            picked[json.loads(res.data)["question"]["id"]] += 1
+        self.assertGreater(min(picked.values()), 60)
+
+    def test_batch_add_delete_questions(self):
+        """
+        Test POST /questions/batch and DELETE /questions/batch, including per-item errors
+        """
+        headers = {
+            'Content-Type': 'application/json'
+        }
+        marker = "batch test question"
+        questions = [{
+            "answer": "answer {}".format(i),
+            "category": 4,
+            "difficulty": 2,
+            "question": "{} {}".format(marker, i)
+        } for i in range(3)]
+        questions.append({"category": 4, "difficulty": 2, "question": marker})
+        res = self.client.post('/questions/batch', data=json.dumps({"questions": questions}), headers=headers)
+        self.assertEqual(res.status_code, 200)
+        body = json.loads(res.data)
+        self.assertEqual(body["inserted"], 3)
+        self.assertEqual(body["errors"][0]["index"], 3)
+
+        res = self.client.post('/search', data=json.dumps({"searchTerm": marker}), headers=headers)
+        ids = [question["id"] for question in json.loads(res.data)["questions"]]
+        self.assertEqual(len(ids), 3)
+        res = self.client.delete('/questions/batch', data=json.dumps({"ids": ids + [0, "x"]}), headers=headers)
+        self.assertEqual(res.status_code, 200)
+        body = json.loads(res.data)
+        self.assertEqual(body["deleted"], 3)
+        self.assertEqual(sorted(error["index"] for error in body["errors"]), [3, 4])
+
+    def test_batch_delete_questions_mixed_items(self):
+        """
+        Test that lists and objects in a DELETE /questions/batch are reported per item
+        """
+        headers = {
+            'Content-Type': 'application/json'
+        }
+        ids = [999999, [1], {"id": 1}, True]
+        res = self.client.delete('/questions/batch', data=json.dumps({"ids": ids}), headers=headers)
+        self.assertEqual(res.status_code, 200)
+        body = json.loads(res.data)
+        self.assertEqual(body["deleted"], 0)
+        self.assertEqual(body["errors"], [
+            {"index": 0, "message": "question not found"},
+            {"index": 1, "message": "id must be an integer"},
+            {"index": 2, "message": "id must be an integer"},
+            {"index": 3, "message": "id must be an integer"}
+        ])
+
+    def test_batch_add_questions_fail(self):
+        headers = {
+            'Content-Type': 'application/json'
+        }
+        res = self.client.post('/questions/batch', data=json.dumps({"questions": {}}), headers=headers)
+        self.assertEqual(res.status_code, 400)
+
     def test_add_question_fail(self):
         """ 
         Test the error condition DELETE /questions/<question_id> endpoint which deletes a specific question
@@ -200,6 +304,23 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(body["questions"][0]["id"], expected_response["questions"][0]["id"])
         self.assertEqual(body["questions"][0]["question"], expected_response["questions"][0]["question"]) 
 
+    def test_search_answer_and_category(self):
+        """
+        Test that POST /search matches answers too and honours the category filter
+        """
+        headers = {
+            'Content-Type': 'application/json'
+        }
+        res = self.client.post('/search', data=json.dumps({"searchTerm": "Maya Angelou"}), headers=headers)
+        self.assertEqual(res.status_code, 200)
+        body = json.loads(res.data)
+        self.assertEqual(body["questions"][0]["id"], 5)
+        self.assertEqual(body["total_questions"], len(body["questions"]))
+        res = self.client.post('/search', data=json.dumps({"searchTerm": "Maya Angelou", "category": 5}), headers=headers)
+        body = json.loads(res.data)
+        self.assertEqual(body["questions"], [])
+        self.assertEqual(body["total_questions"], 0)
+
     def test_fail_search(self):        
         body = {}
         headers = {
@@ -231,6 +352,32 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
 
 
+    def test_play_until_exhausted(self):
+        """
+        Test that POST /quizzes never repeats a question and returns an empty body once the category is exhausted
+        """
+        headers = {
+            'Content-Type': 'application/json'
+        }
+        previous_questions = []
+        while True:
+            body = {
+                "previous_questions": previous_questions,
+                "quiz_category": {
+                    "type": "Sports",
+                    "id": 6,
+                }
+            }
+            res = self.client.post('/quizzes', data=json.dumps(body), headers=headers)
+            self.assertEqual(res.status_code, 200)
+            question = json.loads(res.data).get("question")
+            if question is None:
+                break
+            self.assertNotIn(question["id"], previous_questions)
+            self.assertEqual(str(question["category"]), "6")
+            previous_questions.append(question["id"])
+        self.assertGreater(len(previous_questions), 0)
+
     def test_fail_play(self):
         headers = {
             'Content-Type': 'application/json'
@@ -240,9 +387,18 @@ class TriviaTestCase(unittest.TestCase):
             "previous_questions": []
         }
         res = self.client.post('/quizzes', data=json.dumps(body), headers=headers)
-        # bad request 
+        # bad request
         self.assertEqual(res.status_code, 400)
 
+    def test_metrics(self):
+        self.client.get('/questions?page=1')
+        res = self.client.get('/metrics')
+        self.assertEqual(res.status_code, 200)
+        body = res.get_data(as_text=True)
+        self.assertIn('http_requests_total{endpoint="get_all_questions",method="GET",status="200"} 1', body)
+        self.assertIn('db_queries_per_request_count{endpoint="get_all_questions"} 1', body)
+        self.assertNotIn('endpoint="metrics"', body)
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
@@ -1,14 +1,23 @@
 import os
-from flask import Flask, request, jsonify, abort
+from flask import Flask, request, abort
 from sqlalchemy import exc
 import json
 from flask_cors import CORS
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import (db_drop_and_create_all, setup_db, Drink,
+                              drink_rows, short_drink, long_drink)
 from .auth.auth import AuthError, requires_auth
+from .response_cache import ResponseCache, cached_json_response
+from .instrumentation import Instrumentation
+from .fast_json import FastJSON, jsonify
 
 app = Flask(__name__)
 db = setup_db(app)
 CORS(app)
+instrumentation = Instrumentation(app)
+FastJSON(app)
+
+# encoded /drinks and /drinks-detail bodies, cleared by every write endpoint
+drinks_cache = ResponseCache()
 
 '''
 @TODO uncomment the following line to initialize the datbase
@@ -30,12 +39,13 @@ CORS(app)
 
 @app.route('/drinks')
 def drinks():
-    all_drinks = Drink.query.all()
-    formatted_drinks = [drink.short() for drink in all_drinks]
-    return jsonify({
-        "success": True,
-        "drinks": formatted_drinks
-    })
+    def build():
+        formatted_drinks = [short_drink(row) for row in drink_rows()]
+        return {
+            "success": True,
+            "drinks": formatted_drinks
+        }
+    return cached_json_response(drinks_cache, 'drinks', build)
 
 
 '''
@@ -51,12 +61,13 @@ def drinks():
 @app.route('/drinks-detail')
 @requires_auth('get:drinks-detail')
 def get_drinks_details():
-    drinks = Drink.query.all()
-    formatted_drinks = [drink.long() for drink in drinks]
-    return jsonify({
-        "success": True,
-        "drinks": formatted_drinks
-    })
+    def build():
+        formatted_drinks = [long_drink(row) for row in drink_rows()]
+        return {
+            "success": True,
+            "drinks": formatted_drinks
+        }
+    return cached_json_response(drinks_cache, 'drinks-detail', build)
 
 
 '''
@@ -75,8 +86,9 @@ def create_drinks():
     body = request.get_json()
     try:
         new_drink = Drink(title=body['title'],
-                          recipe=json.dumps(body['recipe']))
+                          recipe=body['recipe'])
         new_drink.insert()
+        drinks_cache.clear()
     except Exception as e:
         abort(500)
     return jsonify({
@@ -111,8 +123,9 @@ def update_drinks(drink_id):
         if 'title' in body:
             drink.title = body['title']
         if 'recipe' in body:
-            drink.recipe = json.dumps(body['recipe'])
+            drink.recipe = body['recipe']
         drink.update()
+        drinks_cache.clear()
     except Exception as e:
         abort(500)
     return jsonify({
@@ -138,6 +151,7 @@ def delete_drinks(drink_id):
     try:
         drink = Drink.query.filter(Drink.id == drink_id).one_or_none()
         drink.delete()
+        drinks_cache.clear()
     except Exception as e:
         abort(500, "who knows what happened")
     return jsonify({
@@ -1,14 +1,23 @@
-import json
 from flask import request, _request_ctx_stack
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+from .jwks import JWKSCache
+from .token_cache import TokenCache
+from .permissions import PermissionSet, compile_permission
 
 
 AUTH0_DOMAIN = 'fsndudacityguru.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'drinks'
 
+# signing keys are fetched once and refreshed in the background,
+# tests can point jwks_cache.fetcher at a local stand-in
+jwks_cache = JWKSCache(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+
+# verified payloads, so a client polling with the same token skips the
+# RS256 check until the token expires
+token_cache = TokenCache(maxsize=1024)
+
 # AuthError Exception
 '''
 AuthError Exception
@@ -79,26 +88,28 @@ def get_token_auth_header():
 
 
 def check_permissions(permission, payload):
-    try:
-        if "permissions" not in payload:
-            raise AuthError({
-                'code': 'invalid_permissions',
-                'description': 'Permissions not found'
-            }, 401)
+    required = (permission,) if isinstance(permission, str) else permission
+    return _check_permissions([compile_permission(p) for p in required], payload)
 
-        if permission not in payload["permissions"]:
-            print(f"payload: {payload},   permission: {permission}")
+
+def _check_permissions(matchers, payload, granted=None):
+    # matchers compiled by compile_permission, granted the PermissionSet
+    # of the payload when it is already built
+    if "permissions" not in payload:
+        raise AuthError({
+            'code': 'invalid_permissions',
+            'description': 'Permissions not found'
+        }, 401)
+
+    if granted is None:
+        granted = PermissionSet(payload["permissions"])
+    for matches in matchers:
+        if not matches(granted):
             raise AuthError({
                 'code': 'invalid_permissions',
                 'description': 'Request is not authorized due to permissions'
             }, 401)
-    except AuthError as a:
-        raise
-    except Exception as e:
-        raise AuthError({
-            'code': 'unknown_error',
-            'description': 'Unknown error while checking permissions'
-        }, 422)
+    return True
 
 
 '''
@@ -117,25 +128,20 @@ def check_permissions(permission, payload):
 
 
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
     unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    try:
+        rsa_key = jwks_cache.get_key(unverified_header['kid'])
+    except Exception:
+        raise AuthError({
+            'code': 'jwks_unavailable',
+            'description': 'Unable to fetch the signing keys.'
+        }, 503)
 
     if rsa_key:
         try:
@@ -177,7 +183,10 @@ def verify_decode_jwt(token):
 '''
 @TODO implement @requires_auth(permission) decorator method
     @INPUTS
-        permission: string permission (i.e. 'post:drink')
+        permissions: one or more string permissions (i.e. 'post:drink'),
+            all of them are required. wildcards such as '*:drinks' are
+            accepted, see compile_permission. no permission, or one that
+            is not 'action:resource', raises ValueError when decorating
 
     it should use the get_token_auth_header method to get the token
     it should use the verify_decode_jwt method to decode the jwt
@@ -186,13 +195,24 @@ def verify_decode_jwt(token):
 '''
 
 
-def requires_auth(permission=''):
+def requires_auth(*permissions):
+    if not permissions:
+        raise ValueError('requires_auth needs at least one permission')
+    matchers = [compile_permission(permission) for permission in permissions]
+
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
+            cached = token_cache.get(token)
+            if cached is None:
+                payload = verify_decode_jwt(token)
+                # built once here and cached next to the payload
+                granted = PermissionSet(payload.get('permissions', []))
+                token_cache.set(token, payload, granted)
+            else:
+                payload, granted = cached
+            _check_permissions(matchers, payload, granted)
             return f(*args, **kwargs)
 
         return wrapper
@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+from urllib.request import urlopen
+
+
+def urlopen_fetcher(url):
+    jsonurl = urlopen(url, timeout=5)
+    return json.loads(jsonurl.read())
+
+
+'''
+JWKSCache
+    in-process cache of the Auth0 signing keys, indexed by key id (kid)
+
+    @INPUTS
+        url: the /.well-known/jwks.json endpoint
+        fetcher: callable(url) returning the decoded jwks document,
+            swap it for a local stand-in in tests
+        ttl: seconds the keys are served without revalidation
+        stale_ttl: seconds after which stale keys are no longer served
+            and a refresh blocks the request
+        refetch_interval: minimum seconds between two fetches, so forged
+            kids or a failing Auth0 cannot make every request fetch
+
+    between ttl and stale_ttl the cached keys keep being served while a
+    single background thread refreshes them. past stale_ttl get_key
+    raises until a fetch succeeds, retried at most every refetch_interval
+'''
+
+
+class JWKSCache:
+    def __init__(self, url, fetcher=urlopen_fetcher, ttl=600, stale_ttl=3600,
+                 refetch_interval=30, clock=time.monotonic):
+        self.url = url
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.refetch_interval = refetch_interval
+        self.clock = clock
+        self._keys = {}
+        self._fetched_at = None
+        self._last_attempt = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get_key(self, kid):
+        age = self._age()
+        if age is None or age >= self.stale_ttl:
+            self._refresh(self.stale_ttl)
+        elif age >= self.ttl:
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is None and self._may_refetch():
+            # the tenant may have rotated its keys since the last fetch
+            self._refresh(0)
+            key = self._keys.get(kid)
+        return key
+
+    def refresh(self):
+        with self._lock:
+            self._fetch()
+
+    def _refresh(self, max_age):
+        # fetches unless keys younger than max_age came in while waiting
+        # for the lock, or the last attempt is too recent; raises when
+        # what is left is older than stale_ttl
+        with self._lock:
+            age = self._age()
+            if age is not None and age < max_age:
+                return
+            error = None
+            if self._may_refetch():
+                try:
+                    self._fetch()
+                except Exception as e:
+                    error = e
+            age = self._age()
+            if age is None or age >= self.stale_ttl:
+                raise RuntimeError('no signing keys fetched in the last {} seconds'
+                                   .format(self.stale_ttl)) from error
+
+    def _fetch(self):
+        # called with the lock held
+        self._last_attempt = self.clock()
+        jwks = self.fetcher(self.url)
+        self._keys = {
+            key['kid']: {
+                'kty': key['kty'],
+                'kid': key['kid'],
+                'use': key['use'],
+                'n': key['n'],
+                'e': key['e']
+            }
+            for key in jwks['keys'] if 'kid' in key
+        }
+        self._fetched_at = self.clock()
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = None
+            self._last_attempt = None
+
+    def _age(self):
+        if self._fetched_at is None:
+            return None
+        return self.clock() - self._fetched_at
+
+    def _may_refetch(self):
+        return (self._last_attempt is None or
+                self.clock() - self._last_attempt >= self.refetch_interval)
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing or not self._may_refetch():
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self._refresh(self.ttl)
+            except Exception:
+                pass
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
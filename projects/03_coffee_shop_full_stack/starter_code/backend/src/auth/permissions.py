@@ -0,0 +1,59 @@
+'''
+PermissionSet
+    the permissions claim of a verified token, built once per token and
+    cached next to its payload
+
+    besides the exact 'action:resource' strings it keeps the set of actions
+    and resources so wildcard requirements are answered with a set lookup.
+    a token may itself be granted a wildcard such as '*:drinks'
+'''
+
+
+class PermissionSet:
+    __slots__ = ('exact', 'actions', 'resources')
+
+    def __init__(self, permissions):
+        self.exact = frozenset(permissions)
+        pairs = [p.split(':', 1) for p in self.exact if ':' in p]
+        self.actions = frozenset(action for action, _ in pairs)
+        self.resources = frozenset(resource for _, resource in pairs)
+
+    def __contains__(self, permission):
+        if permission in self.exact:
+            return True
+        action, _, resource = permission.partition(':')
+        return ('*:' + resource in self.exact or
+                action + ':*' in self.exact or
+                '*:*' in self.exact)
+
+    def __len__(self):
+        return len(self.exact)
+
+
+'''
+compile_permission(permission)
+    @INPUTS
+        permission: required permission, i.e. 'post:drinks', '*:drinks'
+            (any action on drinks), 'get:*' (get on any resource) or '*:*',
+            which only a token granted '*:*' itself satisfies
+
+    returns a matcher taking a PermissionSet. raises ValueError for
+    anything but a non empty 'action:resource' string, called once per
+    permission when a view is decorated
+'''
+
+
+def compile_permission(permission):
+    action, _, resource = (permission or '').partition(':')
+    if not action or not resource:
+        raise ValueError(
+            'invalid permission {!r}, expected action:resource'.format(permission))
+    if action == '*' and resource == '*':
+        return lambda granted: permission in granted.exact
+    if action == '*':
+        return lambda granted: (resource in granted.resources or
+                                '*' in granted.resources)
+    if resource == '*':
+        return lambda granted: (action in granted.actions or
+                                '*' in granted.actions)
+    return lambda granted: permission in granted
@@ -1,26 +1,32 @@
 import os
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, JSON, select, text
+from sqlalchemy.orm import validates
 from flask_sqlalchemy import SQLAlchemy
 import json
+from .db_pool import engine_options, setup_pool
 
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
-database_path = "sqlite:///{}".format(
-    os.path.join(project_dir, database_filename))
+database_path = os.environ.get("DATABASE_URL", "sqlite:///{}".format(
+    os.path.join(project_dir, database_filename)))
 
 db = SQLAlchemy()
 
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    the connection pool is configured from the DB_* settings, see db_pool.py
 '''
 
 
 def setup_db(app):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(
+        database_path, app.config)
     db.app = app
     db.init_app(app)
+    setup_pool(app, db.engine)
     return db
 
 
@@ -37,6 +43,57 @@ def db_drop_and_create_all():
     db.create_all()
 
 
+'''
+db_migrate_recipe_json()
+    converts an existing drink table from the old String(180) recipe column
+    to the native JSON column used by the Drink model, keeping all rows
+    on postgres the column type is altered in place, on sqlite the column
+    keeps its storage class and every recipe is re-encoded as canonical json
+'''
+
+
+def db_migrate_recipe_json():
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text(
+            'ALTER TABLE drink ALTER COLUMN recipe TYPE JSON USING recipe::json'))
+    else:
+        rows = db.session.execute(text('SELECT id, recipe FROM drink')).fetchall()
+        for id, recipe in rows:
+            db.session.execute(
+                text('UPDATE drink SET recipe = :recipe WHERE id = :id'),
+                {'recipe': json.dumps(json.loads(recipe)), 'id': id})
+    db.session.commit()
+
+
+'''
+drink_rows()
+    all drinks as plain (id, title, recipe) rows, read with a Core select
+    the menu endpoints format these with short_drink()/long_drink() rather
+    than loading Drink instances into the session's identity map
+'''
+
+
+def drink_rows():
+    table = Drink.__table__
+    query = select([table.c.id, table.c.title, table.c.recipe]).\
+        order_by(table.c.id)
+    return db.session.execute(query)
+
+
+def short_recipe(recipe):
+    return [{'color': r['color'], 'parts': r['parts']} for r in recipe]
+
+
+def short_drink(row):
+    id, title, recipe = row
+    return {'id': id, 'title': title, 'recipe': short_recipe(recipe)}
+
+
+def long_drink(row):
+    id, title, recipe = row
+    return {'id': id, 'title': title, 'recipe': recipe}
+
+
 '''
 Drink
 a persistent drink entity, extends the base SQLAlchemy Model
@@ -48,23 +105,34 @@ class Drink(db.Model):
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
+    # the ingredients blob - decoded once when the row is loaded
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
-    recipe = Column(String(180), nullable=False)
+    recipe = Column(JSON, nullable=False)
+
+    @validates('recipe')
+    def validate_recipe(self, key, recipe):
+        # still accept the json strings older clients send
+        if isinstance(recipe, str):
+            recipe = json.loads(recipe)
+        self._short_recipe = None
+        return recipe
 
     '''
     short()
         short form representation of the Drink model
+        the short recipe is computed once per loaded drink, assign a new
+        recipe (rather than mutating it in place) to refresh it
     '''
 
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']}
-                        for r in json.loads(self.recipe)]
+        recipe = getattr(self, '_short_recipe', None)
+        if recipe is None:
+            recipe = short_recipe(self.recipe)
+            self._short_recipe = recipe
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': short_recipe
+            'recipe': recipe
         }
 
     '''
@@ -76,7 +144,7 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': self.recipe
         }
 
     '''
@@ -0,0 +1,65 @@
+import hashlib
+import threading
+import time
+from flask import Response, request
+from .fast_json import dumps, json_response
+
+
+'''
+ResponseCache
+    keeps fully encoded json responses (bytes plus their ETag) by key
+
+    the menu endpoints are nearly all reads, so the body is built and
+    encoded once and served as is until a write endpoint calls clear()
+    the cache is per process: an entry also expires after `ttl` seconds,
+    which is how long other workers keep serving a menu after a write
+    a body built while clear() runs is returned but not kept, it may
+    predate the write
+'''
+
+
+class ResponseCache:
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._entries = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] > time.monotonic():
+            return entry
+        generation = self._generation
+        body = dumps(build())
+        entry = (body, hashlib.sha1(body).hexdigest(), time.monotonic() + self.ttl)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = entry
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+'''
+cached_json_response(cache, key, build)
+    @INPUTS
+        cache: a ResponseCache
+        key: cache key of the endpoint
+        build: callable returning the json-serializable body on a miss
+
+    returns a 304 when the request's If-None-Match matches the cached ETag,
+    the pre-encoded body otherwise
+'''
+
+
+def cached_json_response(cache, key, build):
+    body, etag, _ = cache.get(key, build)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = json_response(body)
+    response.set_etag(etag)
+    return response
@@ -0,0 +1,131 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+# the models read their database from the environment when they are imported
+database_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///{}'.format(
+    os.path.join(database_dir, 'test.db'))
+
+from src.api import app, drinks_cache
+from src.auth.auth import token_cache
+from src.auth.permissions import PermissionSet
+from src.database.models import db_drop_and_create_all, Drink
+from src.response_cache import ResponseCache
+
+BARISTA_TOKEN = 'barista'
+MANAGER_TOKEN = 'manager'
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    """The encoded response cache on its own"""
+
+    def test_body_is_built_once(self):
+        cache = ResponseCache()
+        builds = []
+
+        def build():
+            builds.append(1)
+            return {'n': len(builds)}
+
+        first = cache.get('key', build)
+        self.assertEqual(cache.get('key', build), first)
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(json.loads(first[0]), {'n': 1})
+
+    def test_body_built_across_clear_is_not_stored(self):
+        cache = ResponseCache()
+
+        def build():
+            # a write lands while the body is being built
+            cache.clear()
+            return {'stale': True}
+
+        body, _, _ = cache.get('key', build)
+        self.assertEqual(json.loads(body), {'stale': True})
+        body, _, _ = cache.get('key', lambda: {'stale': False})
+        self.assertEqual(json.loads(body), {'stale': False})
+
+
+class DrinksCacheTestCase(unittest.TestCase):
+    """The cached menu endpoints, cleared by the write endpoints.
+
+    Tokens are put straight into the token cache of auth.py with their
+    permissions, so no Auth0 tenant is needed.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        exp = time.time() + 3600
+        for token, permissions in [
+                (BARISTA_TOKEN, ['get:drinks-detail']),
+                (MANAGER_TOKEN, ['get:drinks-detail', 'post:drinks',
+                                 'patch:drinks', 'delete:drinks'])]:
+            payload = {'sub': token, 'exp': exp, 'permissions': permissions}
+            token_cache.set(token, payload, PermissionSet(permissions))
+
+    @classmethod
+    def tearDownClass(cls):
+        token_cache.clear()
+
+    def setUp(self):
+        self.client = app.test_client()
+        with app.app_context():
+            db_drop_and_create_all()
+            Drink(title='water',
+                  recipe=[{'name': 'water', 'color': 'blue', 'parts': 1}]).insert()
+        drinks_cache.clear()
+
+    def headers(self, token, **headers):
+        return dict(headers, Authorization='Bearer {}'.format(token))
+
+    def titles(self, res):
+        self.assertEqual(res.status_code, 200)
+        return [drink['title'] for drink in json.loads(res.data)['drinks']]
+
+    def test_writes_clear_the_cache(self):
+        self.assertEqual(self.titles(self.client.get('/drinks')), ['water'])
+        self.assertEqual(self.titles(self.client.get(
+            '/drinks-detail', headers=self.headers(BARISTA_TOKEN))), ['water'])
+
+        res = self.client.post('/drinks', headers=self.headers(MANAGER_TOKEN), json={
+            'title': 'matcha', 'recipe': [{'name': 'matcha', 'color': 'green', 'parts': 1}]})
+        self.assertEqual(res.status_code, 200)
+        drink_id = json.loads(res.data)['drinks']['id']
+        self.assertEqual(self.titles(self.client.get('/drinks')), ['water', 'matcha'])
+        self.assertEqual(self.titles(self.client.get(
+            '/drinks-detail', headers=self.headers(BARISTA_TOKEN))), ['water', 'matcha'])
+
+        res = self.client.patch('/drinks/{}'.format(drink_id),
+                                headers=self.headers(MANAGER_TOKEN),
+                                json={'title': 'matcha latte'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.titles(self.client.get('/drinks')), ['water', 'matcha latte'])
+
+        res = self.client.delete('/drinks/{}'.format(drink_id),
+                                 headers=self.headers(MANAGER_TOKEN))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.titles(self.client.get('/drinks')), ['water'])
+
+    def test_if_none_match(self):
+        res = self.client.get('/drinks')
+        etag = res.headers['ETag']
+        res = self.client.get('/drinks', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+        self.assertEqual(res.headers['ETag'], etag)
+
+        res = self.client.get('/drinks', headers={'If-None-Match': '"other"'})
+        self.assertEqual(res.status_code, 200)
+
+        self.client.delete('/drinks/1', headers=self.headers(MANAGER_TOKEN))
+        res = self.client.get('/drinks', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,209 @@
+import threading
+import unittest
+
+from jose import jwt
+
+from src.auth import auth
+from src.auth.auth import AuthError, check_permissions, requires_auth, verify_decode_jwt
+from src.auth.jwks import JWKSCache
+from src.auth.token_cache import TokenCache
+
+
+def jwks(*kids):
+    return {'keys': [{'kid': kid, 'kty': 'RSA', 'use': 'sig', 'n': 'n', 'e': 'AQAB'}
+                     for kid in kids]}
+
+
+class FakeFetcher:
+    """Stands in for Auth0: counts the fetches and serves `document`."""
+
+    def __init__(self, document):
+        self.document = document
+        self.error = None
+        self.fetches = 0
+        self.fetched = threading.Event()
+        # cleared to hold a fetch until the test sets it again
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, url):
+        self.fetches += 1
+        self.release.wait(5)
+        try:
+            if self.error is not None:
+                raise self.error
+            return self.document
+        finally:
+            self.fetched.set()
+
+
+class JWKSCacheTestCase(unittest.TestCase):
+    """The signing key cache, with a fake fetcher and clock"""
+
+    def setUp(self):
+        self.now = 1000.0
+        self.fetcher = FakeFetcher(jwks('a'))
+        self.cache = JWKSCache('https://example.test/.well-known/jwks.json',
+                               fetcher=self.fetcher, ttl=600, stale_ttl=3600,
+                               refetch_interval=30, clock=lambda: self.now)
+
+    def wait_for_refresh(self):
+        self.assertTrue(self.fetcher.fetched.wait(5))
+        # the keys are stored after the fetcher returns
+        for thread in threading.enumerate():
+            if thread is not threading.current_thread() and thread.daemon:
+                thread.join(5)
+
+    def test_keys_are_served_within_ttl(self):
+        self.assertEqual(self.cache.get_key('a')['kid'], 'a')
+        self.now += 599
+        self.assertEqual(self.cache.get_key('a')['kid'], 'a')
+        self.assertEqual(self.fetcher.fetches, 1)
+
+    def test_background_refresh_between_ttl_and_stale_ttl(self):
+        self.cache.get_key('a')
+        self.fetcher.fetched.clear()
+        self.fetcher.release.clear()
+        self.fetcher.document = jwks('b')
+        self.now += 600
+        # the cached key is served while the refresh runs
+        self.assertEqual(self.cache.get_key('a')['kid'], 'a')
+        self.fetcher.release.set()
+        self.wait_for_refresh()
+        self.assertEqual(self.fetcher.fetches, 2)
+        self.assertEqual(self.cache.get_key('b')['kid'], 'b')
+        self.assertIsNone(self.cache.get_key('a'))
+
+    def test_stale_keys_are_not_served(self):
+        self.cache.get_key('a')
+        self.fetcher.error = OSError('Auth0 is down')
+        self.now += 3600
+        with self.assertRaises(RuntimeError):
+            self.cache.get_key('a')
+        # the failed attempt is not repeated before refetch_interval
+        with self.assertRaises(RuntimeError):
+            self.cache.get_key('a')
+        self.assertEqual(self.fetcher.fetches, 2)
+        self.fetcher.error = None
+        self.now += 30
+        self.assertEqual(self.cache.get_key('a')['kid'], 'a')
+        self.assertEqual(self.fetcher.fetches, 3)
+
+    def test_unknown_kid_refetch_is_rate_limited(self):
+        self.cache.get_key('a')
+        self.now += 30
+        self.fetcher.document = jwks('a', 'rotated')
+        self.assertEqual(self.cache.get_key('rotated')['kid'], 'rotated')
+        self.assertEqual(self.fetcher.fetches, 2)
+        # forged kids do not reach Auth0 more than once per refetch_interval
+        for kid in ('forged-1', 'forged-2', 'forged-3'):
+            self.assertIsNone(self.cache.get_key(kid))
+        self.assertEqual(self.fetcher.fetches, 2)
+        self.now += 30
+        self.assertIsNone(self.cache.get_key('forged-4'))
+        self.assertEqual(self.fetcher.fetches, 3)
+
+    def test_unavailable_keys_are_a_503(self):
+        self.fetcher.error = OSError('Auth0 is down')
+        token = jwt.encode({'sub': 'test'}, 'secret', algorithm='HS256',
+                           headers={'kid': 'a'})
+        jwks_cache, auth.jwks_cache = auth.jwks_cache, self.cache
+        try:
+            with self.assertRaises(AuthError) as raised:
+                verify_decode_jwt(token)
+        finally:
+            auth.jwks_cache = jwks_cache
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertEqual(raised.exception.error['code'], 'jwks_unavailable')
+
+
+class TokenCacheTestCase(unittest.TestCase):
+    """The verified payload cache, with a fake clock"""
+
+    def setUp(self):
+        self.now = 1000
+        self.cache = TokenCache(maxsize=2, clock=lambda: self.now)
+
+    def payload(self, sub, exp=2000):
+        return {'sub': sub, 'exp': exp}
+
+    def test_least_recently_used_is_evicted(self):
+        for token in ('a', 'b'):
+            self.cache.set(token, self.payload(token), {token})
+        # reading a makes b the least recently used
+        self.assertEqual(self.cache.get('a'), (self.payload('a'), {'a'}))
+        self.cache.set('c', self.payload('c'), {'c'})
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNotNone(self.cache.get('c'))
+        self.assertEqual(self.cache.stats()['size'], 2)
+
+    def test_entries_expire_at_exp(self):
+        self.cache.set('a', self.payload('a', exp=1010), set())
+        self.now = 1009
+        self.assertIsNotNone(self.cache.get('a'))
+        self.now = 1010
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_hits_and_misses_are_counted(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.set('a', self.payload('a'), set())
+        self.cache.get('a')
+        self.cache.get('a')
+        self.assertEqual(self.cache.stats(),
+                         {'size': 1, 'maxsize': 2, 'hits': 2, 'misses': 1})
+        self.cache.clear()
+        self.assertEqual(self.cache.stats(),
+                         {'size': 0, 'maxsize': 2, 'hits': 0, 'misses': 0})
+
+    def test_tokens_without_exp_are_not_cached(self):
+        self.cache.set('a', {'sub': 'a'}, set())
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+
+class PermissionsTestCase(unittest.TestCase):
+    """Required permissions against the permissions claim of a token"""
+
+    # (required, granted, allowed)
+    TABLE = [
+        ('get:drinks', ['get:drinks'], True),
+        ('get:drinks', ['get:drinks-detail'], False),
+        ('*:drinks', ['delete:drinks'], True),
+        ('*:drinks', ['get:drinks-detail'], False),
+        ('get:*', ['get:drinks-detail'], True),
+        ('get:*', ['post:drinks'], False),
+        ('*:*', ['get:drinks', 'post:drinks'], False),
+        ('*:*', ['*:*'], True),
+        # a granted wildcard covers the requirements it matches
+        ('patch:drinks', ['*:drinks'], True),
+        ('patch:drinks', ['patch:*'], True),
+        ('patch:drinks', ['*:*'], True),
+        ('get:drinks', ['*:drinks-detail'], False),
+        ('*:drinks', ['*:*'], True),
+        ('get:*', ['*:*'], True),
+    ]
+
+    def test_required_against_granted(self):
+        for required, granted, allowed in self.TABLE:
+            with self.subTest(required=required, granted=granted):
+                payload = {'permissions': granted}
+                if allowed:
+                    self.assertTrue(check_permissions(required, payload))
+                else:
+                    with self.assertRaises(AuthError) as raised:
+                        check_permissions(required, payload)
+                    self.assertEqual(raised.exception.status_code, 401)
+
+    def test_invalid_permissions_fail_at_decoration(self):
+        for permissions in [(), ('drinks',), ('get:',), (':drinks',), (None,),
+                            ('get:drinks', 'post')]:
+            with self.subTest(permissions=permissions):
+                with self.assertRaises(ValueError):
+                    requires_auth(*permissions)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()